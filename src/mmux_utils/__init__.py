@@ -0,0 +1,162 @@
+### Lazy top-level API: `from mmux_utils import load_data` only imports funs_data_processing (and its
+### dependencies) on first access, so that eg evaluation workers that only need the config builders
+### or the data loaders do not pay for Dakota, statsmodels or matplotlib (PEP 562).
+import importlib
+from typing import Dict, List
+
+_SUBMODULES = [
+    "funs_benchmark",
+    "funs_cache",
+    "funs_create_dakota_conf",
+    "funs_data_processing",
+    "funs_evaluate",
+    "funs_fake_dakota",
+    "funs_git",
+    "funs_gp_evaluation",
+    "funs_gp_predictor",
+    "funs_hypervolume",
+    "funs_journal",
+    "funs_pareto",
+    "funs_study_farm",
+    "funs_surrogate_convergence",
+    "funs_tracing",
+    "plot_pareto_front",
+    "plot_surr",
+]
+
+## public name -> submodule defining it
+_LAZY_ATTRS: Dict[str, str] = {
+    **dict.fromkeys(
+        [
+            "start_dakota_file",
+            "add_adaptive_sampling",
+            "add_continuous_variables",
+            "add_interface_s4l",
+            "add_responses",
+            "add_surrogate_model",
+            "add_iterative_sumo_optimization",
+            "add_sampling_method",
+            "add_evaluation_method",
+            "add_moga_method",
+            "add_evaluator_model",
+            "add_python_interface",
+            "write_to_file",
+        ],
+        "funs_create_dakota_conf",
+    ),
+    **dict.fromkeys(
+        [
+            "process_json_file",
+            "get_variable_names",
+            "load_data",
+            "process_input_file",
+            "get_results",
+            "TabularFileFollower",
+        ],
+        "funs_data_processing",
+    ),
+    **dict.fromkeys(
+        [
+            "get_input_vector",
+            "get_response_values",
+            "batch_evaluator",
+            "batch_evaluator_local",
+            "single_evaluator",
+            "ParallelBatchEvaluator",
+            "AsyncBatchEvaluator",
+            "create_run_dir",
+            "run_dakota",
+        ],
+        "funs_evaluate",
+    ),
+    **dict.fromkeys(["EvaluationCache", "CachedModel", "CachedEvaluator"], "funs_cache"),
+    **dict.fromkeys(
+        ["EvaluationJournal", "JournaledEvaluator", "run_dakota_with_journal"],
+        "funs_journal",
+    ),
+    **dict.fromkeys(["StudyResult", "run_studies"], "funs_study_farm"),
+    **dict.fromkeys(
+        [
+            "clone_repo",
+            "get_mirror",
+            "get_commit_hash",
+            "import_function_from_repo",
+            "ModelFunctionHandle",
+        ],
+        "funs_git",
+    ),
+    **dict.fromkeys(
+        [
+            "tukeys_method",
+            "tukeys_mask",
+            "make_qqplot",
+            "test_normality",
+            "ResidualDiagnostics",
+            "residual_diagnostics",
+        ],
+        "funs_gp_evaluation",
+    ),
+    **dict.fromkeys(
+        [
+            "GaussianProcess",
+            "GPSurrogate",
+            "make_folds",
+            "cross_validation_metrics",
+        ],
+        "funs_gp_predictor",
+    ),
+    **dict.fromkeys(["EvaluationTracer"], "funs_tracing"),
+    **dict.fromkeys(
+        [
+            "non_dominated_mask",
+            "non_dominated_indices",
+            "crowding_distance",
+            "non_dominated_sort",
+            "select_elites",
+            "ParetoArchive",
+        ],
+        "funs_pareto",
+    ),
+    **dict.fromkeys(
+        [
+            "hypervolume",
+            "hypervolume_monte_carlo",
+            "HypervolumeTracker",
+            "track_finaldata_hypervolume",
+        ],
+        "funs_hypervolume",
+    ),
+    **dict.fromkeys(
+        ["get_dakota_descriptors", "SurrogateConvergenceTracker"],
+        "funs_surrogate_convergence",
+    ),
+    **dict.fromkeys(
+        [
+            "get_non_dominated_indices",
+            "load_data_dakota_free_pulse_optimization",
+            "plot_objective_space",
+            "add_inset_pulses",
+            "PulseInsetRenderer",
+            "add_inset_pulses_batch",
+        ],
+        "plot_pareto_front",
+    ),
+    **dict.fromkeys(["plot_error_vs_std"], "plot_surr"),
+}
+
+__all__: List[str] = sorted(_LAZY_ATTRS) + _SUBMODULES
+
+
+def __getattr__(name: str):
+    if name in _SUBMODULES:
+        return importlib.import_module(f"{__name__}.{name}")
+    if name in _LAZY_ATTRS:
+        module = importlib.import_module(f"{__name__}.{_LAZY_ATTRS[name]}")
+        value = getattr(module, name)
+        globals()[name] = value  # next accesses skip __getattr__
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,483 @@
+### Benchmarks of the evaluation / data processing paths, and the fake models and seeded synthetic
+### data they run on. Run as a script (`python -m mmux_utils.funs_benchmark`) to time the hot paths
+### and append the results to a JSONL file, compared against the previous run to spot regressions.
+from typing import Callable, Dict, List, Optional, Sequence
+from pathlib import Path
+import argparse
+import asyncio
+import datetime
+import functools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+
+def make_fake_async_model(
+    latency: float = 0.05,
+    jitter: float = 0.0,
+    n_outputs: int = 2,
+    seed: Optional[int] = None,
+) -> Callable:
+    """Local stand-in for a latency-bound model (eg job submission + polling):
+    an `async def` model that waits latency (+- uniform jitter) seconds and returns
+    n_outputs cheap functions of the input."""
+    rng = np.random.default_rng(seed)
+
+    async def fake_async_model(input: dict) -> dict:
+        await asyncio.sleep(max(0.0, latency + jitter * (2 * rng.random() - 1)))
+        x = np.asarray(input["cv"] if "cv" in input else list(input.values()), float)
+        return {f"f{j + 1}": float(np.sum(x ** (j + 1))) for j in range(n_outputs)}
+
+    return fake_async_model
+
+
+def benchmark_async_throughput(
+    concurrencies: Sequence[int] = (8, 64, 512),
+    n_evaluations: int = 1000,
+    latency: float = 0.05,
+    jitter: float = 0.0,
+    n_variables: int = 5,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Throughput (evaluations / s) of AsyncBatchEvaluator on a fake async model,
+    for one batch of n_evaluations at each of the given concurrencies."""
+    from mmux_utils.funs_evaluate import AsyncBatchEvaluator
+
+    rng = np.random.default_rng(seed)
+    batch_input = [{"cv": list(x)} for x in rng.random((n_evaluations, n_variables))]
+    model = make_fake_async_model(latency=latency, jitter=jitter, seed=seed)
+    results = []
+    for concurrency in concurrencies:
+        with AsyncBatchEvaluator(model, max_concurrency=concurrency) as evaluator:
+            start = time.perf_counter()
+            evaluator(batch_input)
+            elapsed = time.perf_counter() - start
+        results.append(
+            {
+                "concurrency": concurrency,
+                "n_evaluations": n_evaluations,
+                "elapsed (s)": elapsed,
+                "throughput (evals/s)": n_evaluations / elapsed,
+                "ideal throughput (evals/s)": (
+                    min(concurrency, n_evaluations) / latency if latency else np.inf
+                ),
+            }
+        )
+    return pd.DataFrame(results)
+
+
+## dependencies that should only be imported by the submodules that cannot work without them
+HEAVY_DEPENDENCIES = ("dakota", "statsmodels", "scipy", "matplotlib", "mpl_toolkits", "git")
+
+_IMPORT_TIME_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = sorted(d for d in {heavy!r} if d in sys.modules)
+print(json.dumps({{"seconds": elapsed, "heavy": heavy}}))
+"""
+
+
+def benchmark_import_times(
+    modules: Optional[Sequence[str]] = None,
+    repeats: int = 3,
+    budgets: Optional[Dict[str, float]] = None,
+) -> pd.DataFrame:
+    """Import time of each submodule (and of the package itself), in fresh interpreters -
+    as paid by every spawned evaluation worker. Reports the best of `repeats` runs, the heavy
+    dependencies each import pulled in, and whether it exceeded its budget (in seconds), if any.
+    A submodule that fails to import (eg Dakota not installed) is reported with its error."""
+    import mmux_utils
+
+    if modules is None:
+        modules = ["mmux_utils"] + [f"mmux_utils.{m}" for m in mmux_utils._SUBMODULES]
+    budgets = budgets or {}
+    results = []
+    for module in modules:
+        script = _IMPORT_TIME_SCRIPT.format(module=module, heavy=HEAVY_DEPENDENCIES)
+        seconds, heavy, error = [], [], None
+        for _ in range(repeats):
+            run = subprocess.run(
+                [sys.executable, "-c", script], capture_output=True, text=True
+            )
+            if run.returncode != 0:
+                error = run.stderr.strip().splitlines()[-1]
+                break
+            result = json.loads(run.stdout.strip().splitlines()[-1])
+            seconds.append(result["seconds"])
+            heavy = result["heavy"]
+        budget = budgets.get(module)
+        best = min(seconds) if seconds else np.nan
+        results.append(
+            {
+                "module": module,
+                "import time (s)": best,
+                "heavy dependencies": ", ".join(heavy),
+                "over budget": budget is not None and not best <= budget,
+                "error": error,
+            }
+        )
+    return pd.DataFrame(results)
+
+
+def make_objectives(
+    n_rows: int, n_objectives: int = 2, seed: int = 0, front_fraction: float = 0.01
+) -> pd.DataFrame:
+    """Seeded objective values ("Objective1", ...) to minimize: random points above the unit simplex,
+    roughly front_fraction of them lying (close to) on it - so that the front is not trivially small."""
+    rng = np.random.default_rng(seed)
+    directions = rng.dirichlet(np.ones(n_objectives), size=n_rows)
+    offsets = rng.exponential(1.0, size=(n_rows, 1))
+    offsets[rng.random(n_rows) < front_fraction] = 0.0
+    return pd.DataFrame(
+        directions + offsets * rng.random((n_rows, n_objectives)),
+        columns=[f"Objective{j + 1}" for j in range(n_objectives)],
+    )
+
+
+def write_tabular_file(
+    path: Path,
+    n_rows: int,
+    n_variables: int = 5,
+    responses: Sequence[str] = ("-AFpeak", "energy"),
+    seed: int = 0,
+    block_size: int = 100_000,
+) -> Path:
+    """Seeded Dakota tabular file (%eval_id interface x1 ... responses), written block by block"""
+    rng = np.random.default_rng(seed)
+    header = ["%eval_id", "interface"] + [f"x{j + 1}" for j in range(n_variables)]
+    n_values = n_variables + len(responses)
+    fmt = " ".join(["%d", "NO_ID"] + ["%.10g"] * n_values)
+    with open(path, "w") as f:
+        f.write(" ".join(header + list(responses)) + "\n")
+        for start in range(0, n_rows, block_size):
+            n = min(block_size, n_rows - start)
+            values = rng.random((n, n_values))
+            eval_ids = np.arange(start + 1, start + n + 1)[:, None]
+            np.savetxt(f, np.hstack([eval_ids, values]), fmt=fmt)
+    return Path(path)
+
+
+def write_json_file(
+    path: Path,
+    n_tasks: int,
+    n_inputs: int = 5,
+    outputs: Sequence[str] = ("AFmax_4um", "energy"),
+    seed: int = 0,
+) -> Path:
+    """Seeded JSON export ({"tasks": [{"input": {"InputFile1": {"value": ...}}, "output": ...}]}),
+    in the format read by `funs_data_processing.load_data`"""
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        f.write('{"tasks": [')
+        for i in range(n_tasks):
+            values = rng.random(n_inputs + len(outputs)).tolist()
+            task = {
+                "input": {
+                    "InputFile1": {
+                        "value": {f"x{j + 1}": values[j] for j in range(n_inputs)}
+                    }
+                },
+                "output": {
+                    "OutputFile1": {
+                        "value": dict(zip(outputs, values[n_inputs:]))
+                    }
+                },
+            }
+            f.write(("," if i else "") + json.dumps(task))
+        f.write("]}")
+    return Path(path)
+
+
+def make_dakota_inputs(
+    n_evaluations: int, n_variables: int = 5, seed: int = 0
+) -> List[dict]:
+    """Seeded Dakota evaluation dicts, as received by the (batch) evaluators"""
+    rng = np.random.default_rng(seed)
+    labels = [f"x{j + 1}" for j in range(n_variables)]
+    return [
+        {"eval_id": i + 1, "cv": x, "cv_labels": labels, "functions": 2}
+        for i, x in enumerate(rng.random((n_evaluations, n_variables)).tolist())
+    ]
+
+
+def fake_model(input: dict) -> dict:
+    """Cheap (picklable) model: two functions of the input vector"""
+    x = input["cv"]
+    return {"f1": sum(x), "f2": sum(v * v for v in x)}
+
+
+def _best_time(function: Callable, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _build_configs(n_configs: int) -> str:
+    from mmux_utils import funs_create_dakota_conf as conf
+
+    for i in range(n_configs):
+        dakota_conf = (
+            conf.start_dakota_file(top_method_pointer="OPT")
+            + conf.add_iterative_sumo_optimization()
+            + conf.add_surrogate_model(training_samples_file="training_processed.txt")
+            + conf.add_moga_method(seed=i)
+            + conf.add_evaluator_model()
+            + conf.add_continuous_variables([f"x{j + 1}" for j in range(5)])
+            + conf.add_python_interface("model", batch_mode=True)
+            + conf.add_responses(["-AFpeak", "energy"])
+        )
+    return dakota_conf
+
+
+def _fake_study(n_samples: int, seed: int):
+    from mmux_utils import funs_create_dakota_conf as conf
+    from mmux_utils.funs_evaluate import batch_evaluator_local
+    from mmux_utils.funs_fake_dakota import study
+
+    dakota_conf = (
+        conf.start_dakota_file(results_file_name="fake_study.dat")
+        + conf.add_sampling_method(num_samples=n_samples, seed=seed)
+        + conf.add_continuous_variables([f"x{j + 1}" for j in range(5)])
+        + conf.add_python_interface("model", batch_mode=True)
+        + conf.add_responses(["f1", "f2"])
+    )
+    callbacks = {"batch_evaluator": functools.partial(batch_evaluator_local, fake_model)}
+    study(callbacks=callbacks, input_string=dakota_conf).execute()
+
+
+## benchmark name -> function(size, work_dir, seed) returning a callable to time (data is prepared
+## beforehand, so that only the benchmarked call is timed)
+def _prepare_pareto(size: int, work_dir: Path, seed: int) -> Callable:
+    from mmux_utils.plot_pareto_front import get_non_dominated_indices
+
+    data = make_objectives(size, seed=seed)
+    return lambda: get_non_dominated_indices(data)
+
+
+def _prepare_load_tabular(size: int, work_dir: Path, seed: int, cache: bool = False):
+    from mmux_utils.funs_data_processing import load_data
+
+    file = work_dir / f"tabular_{size}_{seed}.dat"
+    if not file.exists():
+        write_tabular_file(file, size, seed=seed)
+    if cache:
+        load_data(file, cache=True)  # writes the sidecar
+    return lambda: load_data(file, cache=cache)
+
+
+def _prepare_get_results(size: int, work_dir: Path, seed: int) -> Callable:
+    from mmux_utils.funs_data_processing import get_results
+
+    _prepare_load_tabular(size, work_dir, seed)
+    file = work_dir / f"tabular_{size}_{seed}.dat"
+    return lambda: get_results(file, "-AFpeak")
+
+
+def _prepare_load_json(size: int, work_dir: Path, seed: int) -> Callable:
+    from mmux_utils.funs_data_processing import load_data
+
+    file = work_dir / f"tasks_{size}_{seed}.json"
+    if not file.exists():
+        write_json_file(file, size, seed=seed)
+    return lambda: load_data(file)
+
+
+def _prepare_process_input_file(
+    size: int, work_dir: Path, seed: int, chunk_size: Optional[int] = None
+) -> Callable:
+    from mmux_utils.funs_data_processing import process_input_file
+
+    _prepare_load_tabular(size, work_dir, seed)
+    file = work_dir / f"tabular_{size}_{seed}.dat"
+    return lambda: process_input_file(
+        str(file), filter_highest_N=min(size, 1000), chunk_size=chunk_size
+    )
+
+
+def _prepare_batch_evaluator(size: int, work_dir: Path, seed: int) -> Callable:
+    from mmux_utils.funs_evaluate import batch_evaluator_local
+
+    batch_input = make_dakota_inputs(size, seed=seed)
+    return lambda: batch_evaluator_local(fake_model, batch_input)
+
+
+def _prepare_fake_study(size: int, work_dir: Path, seed: int) -> Callable:
+    def run():
+        cwd = Path.cwd()
+        try:
+            os.chdir(work_dir)  # the study writes its tabular file into the cwd
+            _fake_study(size, seed)
+        finally:
+            os.chdir(cwd)
+
+    return run
+
+
+BENCHMARKS: Dict[str, Callable] = {
+    "get_non_dominated_indices": _prepare_pareto,
+    "load_data (dat)": _prepare_load_tabular,
+    "load_data (dat, cached)": functools.partial(_prepare_load_tabular, cache=True),
+    "get_results": _prepare_get_results,
+    "load_data (json)": _prepare_load_json,
+    "process_input_file": _prepare_process_input_file,
+    "process_input_file (chunked)": functools.partial(
+        _prepare_process_input_file, chunk_size=100_000
+    ),
+    "batch_evaluator_local": _prepare_batch_evaluator,
+    "config builders": lambda size, work_dir, seed: lambda: _build_configs(size),
+    "fake study": _prepare_fake_study,
+}
+
+
+def run_benchmarks(
+    sizes: Sequence[int] = (1_000, 10_000, 100_000),
+    benchmarks: Optional[Sequence[str]] = None,
+    repeats: int = 3,
+    seed: int = 0,
+    work_dir: Optional[Path] = None,
+) -> pd.DataFrame:
+    """Best-of-repeats time of each benchmark (see BENCHMARKS) at each size - rows for the data
+    paths, evaluations for the evaluators and studies, configs for the config builders.
+    Synthetic files are generated (once) in work_dir - a temporary directory by default; keeping
+    them between runs avoids regenerating the largest ones (1e7 rows take minutes to write)."""
+    benchmarks = list(BENCHMARKS) if benchmarks is None else list(benchmarks)
+    unknown = set(benchmarks) - set(BENCHMARKS)
+    if unknown:
+        raise ValueError(f"Unknown benchmarks {sorted(unknown)}, choose from {list(BENCHMARKS)}")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = Path(work_dir) if work_dir is not None else Path(tmp_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        results = []
+        for size in sizes:
+            size = int(size)
+            for name in benchmarks:
+                function = BENCHMARKS[name](size, work_dir, seed)
+                seconds = _best_time(function, repeats)
+                results.append(
+                    {
+                        "benchmark": name,
+                        "size": size,
+                        "seconds": seconds,
+                        "items/s": size / seconds if seconds > 0 else np.inf,
+                    }
+                )
+                print(f"{name} ({size}): {seconds:.4f}s")
+    return pd.DataFrame(results)
+
+
+def _get_version() -> str:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("mmux_utils")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def _get_commit() -> Optional[str]:
+    try:
+        from mmux_utils.funs_git import get_commit_hash
+
+        return get_commit_hash(Path(__file__).resolve().parents[2])
+    except Exception:  # not a git checkout (eg installed wheel) or gitpython missing
+        return None
+
+
+def save_results(results: pd.DataFrame, path: Path = Path("benchmarks.jsonl")) -> str:
+    """Append the results to a JSONL file, each record tagged with a run id, the package
+    version and commit, and the machine - returns the run id"""
+    now = datetime.datetime.now()
+    run = {
+        "run": now.strftime("%Y%m%d.%H%M%S.%f"),
+        "time": now.isoformat(timespec="seconds"),
+        "version": _get_version(),
+        "commit": _get_commit(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+    }
+    with open(path, "a") as f:
+        for record in results.to_dict(orient="records"):
+            f.write(json.dumps({**run, **record}, default=float) + "\n")
+    return run["run"]
+
+
+def load_results(path: Path = Path("benchmarks.jsonl")) -> pd.DataFrame:
+    with open(path) as f:
+        return pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+
+def compare_results(
+    path: Path = Path("benchmarks.jsonl"),
+    run: Optional[str] = None,
+    baseline: Optional[str] = None,
+    threshold: float = 1.2,
+) -> pd.DataFrame:
+    """Times of a run (the last one by default) against a baseline run (the one before by default),
+    per benchmark and size - "regression" flags the ones over threshold x the baseline time."""
+    results = load_results(path)
+    runs = list(dict.fromkeys(results["run"]))
+    run = run or runs[-1]
+    if baseline is None:
+        previous = runs[: runs.index(run)]
+        if not previous:
+            raise ValueError(f"No run before {run} in {path} to compare with")
+        baseline = previous[-1]
+    keys = ["benchmark", "size"]
+    current = results[results["run"] == run].set_index(keys)["seconds"]
+    reference = results[results["run"] == baseline].set_index(keys)["seconds"]
+    comparison = pd.DataFrame({"baseline (s)": reference, "current (s)": current}).dropna()
+    comparison["ratio"] = comparison["current (s)"] / comparison["baseline (s)"]
+    comparison["regression"] = comparison["ratio"] > threshold
+    return comparison.reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the mmux_utils hot paths on seeded synthetic data"
+    )
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1e3, 1e4, 1e5])
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", type=Path, help="Where to keep the synthetic files")
+    parser.add_argument("--results", type=Path, default=Path("benchmarks.jsonl"))
+    parser.add_argument("--threshold", type=float, default=1.2)
+    parser.add_argument("--async-throughput", action="store_true")
+    parser.add_argument("--import-times", action="store_true")
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        sizes=[int(s) for s in args.sizes],
+        benchmarks=args.benchmarks,
+        repeats=args.repeats,
+        seed=args.seed,
+        work_dir=args.work_dir,
+    )
+    print(results.to_string(index=False))
+    run = save_results(results, args.results)
+    if len(set(load_results(args.results)["run"])) > 1:
+        comparison = compare_results(args.results, run=run, threshold=args.threshold)
+        print(comparison.to_string(index=False))
+        if comparison["regression"].any():
+            print("Regressions found:")
+            print(comparison[comparison["regression"]].to_string(index=False))
+    if args.async_throughput:
+        print(benchmark_async_throughput().to_string(index=False))
+    if args.import_times:
+        print(benchmark_import_times().to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
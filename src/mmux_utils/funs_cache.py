@@ -0,0 +1,225 @@
+### Persistent evaluation cache - to skip re-evaluating points the optimizer proposes again
+from typing import Callable, Dict, List, Optional, Sequence, Union
+from collections import OrderedDict
+from pathlib import Path
+import json
+import sqlite3
+import threading
+import time
+import numpy as np
+from mmux_utils.funs_evaluate import accepts_on_result, get_input_vector
+
+
+class EvaluationCache:
+    """Evaluation results stored in SQLite, keyed on the (rounded) variable values and a model
+    identity (eg the commit hash given to `funs_git.clone_repo`), with an in-memory LRU tier.
+
+    Args:
+        path: SQLite database file (created if needed). Can be shared by several runs / processes.
+        model_id (str, optional): Identity of the model - results of other models are never returned.
+        decimals (int, optional): Variables are rounded to this many decimals to build the key.
+        max_memory_items (int, optional): Size of the in-memory LRU tier.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        model_id: str = "",
+        decimals: int = 10,
+        max_memory_items: int = 10_000,
+    ):
+        self.path = Path(path)
+        self.model_id = model_id
+        self.decimals = decimals
+        self.max_memory_items = max_memory_items
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self._connection = sqlite3.connect(
+                self.path, timeout=60, check_same_thread=False
+            )
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS evaluations (
+                    key TEXT PRIMARY KEY,
+                    model_id TEXT,
+                    inputs TEXT,
+                    response TEXT,
+                    created REAL
+                )"""
+            )
+            self._connection.commit()
+        return self._connection
+
+    def key(self, input_vector: Sequence[float]) -> str:
+        rounded = np.round(np.asarray(input_vector, dtype=float), self.decimals) + 0.0
+        return self.model_id + "|" + ",".join(repr(v) for v in rounded.tolist())
+
+    def _remember(self, key: str, response: dict):
+        self._memory[key] = response
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, input_vector: Sequence[float]) -> Optional[dict]:
+        """Cached response for input_vector, None if it was never evaluated"""
+        key = self.key(input_vector)
+        with self._lock:
+            if key in self._memory:
+                self.memory_hits += 1
+                self._memory.move_to_end(key)
+                return dict(self._memory[key])
+            row = self.connection.execute(
+                "SELECT response FROM evaluations WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            response = json.loads(row[0])
+            self._remember(key, response)
+            return dict(response)
+
+    def put(self, input_vector: Sequence[float], response: dict):
+        key = self.key(input_vector)
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?)",
+                (
+                    key,
+                    self.model_id,
+                    json.dumps([float(v) for v in input_vector]),
+                    json.dumps(response, default=float),
+                    time.time(),
+                ),
+            )
+            self.connection.commit()
+            self._remember(key, dict(response))
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    def stats(self) -> Dict[str, float]:
+        """Hit / miss counters - each hit is a truth evaluation saved"""
+        lookups = self.hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM evaluations WHERE model_id = ?", (self.model_id,)
+            ).fetchone()[0]
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __getstate__(self):
+        ## connections and locks cannot be pickled - workers reopen the database
+        state = self.__dict__.copy()
+        state.update(_connection=None, _lock=None, _memory=OrderedDict())
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+
+class CachedModel:
+    """Wraps a model (Dakota evaluation dict -> {descriptor: value} dict) with an EvaluationCache,
+    so it can be given to any of the evaluators in `funs_evaluate` - eg
+        batch_evaluator_local(CachedModel(model, EvaluationCache("cache.sqlite", commit_hash)), batch_input)
+
+    The lookups happen in the process running the model: with a "process" ParallelBatchEvaluator,
+    each worker gets its own copy of the cache, and the hit / miss counters of the cache in the
+    calling process stay at 0. Use a CachedEvaluator to look up in (and count in) the caller.
+    """
+
+    def __init__(self, model: Callable, cache: EvaluationCache):
+        self.model = model
+        self.cache = cache
+
+    def __call__(self, input: dict) -> dict:
+        input_vector = get_input_vector(input)
+        response = self.cache.get(input_vector)
+        if response is None:
+            response = self.model(input)
+            self.cache.put(input_vector, response)
+        return response
+
+
+class CachedEvaluator:
+    """Wraps a Dakota evaluator callback (eg a ParallelBatchEvaluator) with an EvaluationCache,
+    looked up and filled in the calling process: inputs found in the cache are answered from it,
+    only the others are sent to the evaluator - so that the cache stats count every evaluation,
+    whichever pool runs the model. Responses are cached as returned by the evaluator (Dakota
+    "fns" dicts), so do not share a model_id with a CachedModel. An on_result callback (see
+    ParallelBatchEvaluator) is called for every response, cached or not, as it becomes available.
+
+    Args:
+        evaluator: Batch callback (list of Dakota dicts -> list of responses) if batch_mode,
+            single-evaluation callback (Dakota dict -> response) otherwise.
+        cache: Where responses are looked up and stored.
+    """
+
+    def __init__(self, evaluator: Callable, cache: EvaluationCache, batch_mode: bool = True):
+        self.evaluator = evaluator
+        self.cache = cache
+        self.batch_mode = batch_mode
+
+    def _evaluate_batch(
+        self, batch_input: List[dict], on_result: Optional[Callable[[int, dict], None]]
+    ) -> List[dict]:
+        input_vectors = [get_input_vector(i) for i in batch_input]
+        responses = [self.cache.get(x) for x in input_vectors]
+        missing = [i for i, r in enumerate(responses) if r is None]
+        if on_result is not None:
+            for i, response in enumerate(responses):
+                if response is not None:
+                    on_result(i, response)
+        if missing:
+            missing_input = [batch_input[i] for i in missing]
+            if on_result is not None and accepts_on_result(self.evaluator):
+
+                def on_missing_result(j: int, response: dict):
+                    self.cache.put(input_vectors[missing[j]], response)
+                    on_result(missing[j], response)
+
+                new_responses = list(self.evaluator(missing_input, on_result=on_missing_result))
+            else:
+                new_responses = list(self.evaluator(missing_input))
+                for i, response in zip(missing, new_responses):
+                    self.cache.put(input_vectors[i], response)
+                    if on_result is not None:
+                        on_result(i, response)
+            for i, response in zip(missing, new_responses):
+                responses[i] = response
+        return responses
+
+    def __call__(
+        self,
+        input: Union[dict, List[dict]],
+        on_result: Optional[Callable[[int, dict], None]] = None,
+    ):
+        if self.batch_mode:
+            return self._evaluate_batch(input, on_result)
+        input_vector = get_input_vector(input)
+        response = self.cache.get(input_vector)
+        if response is None:
+            response = self.evaluator(input)
+            self.cache.put(input_vector, response)
+        return response
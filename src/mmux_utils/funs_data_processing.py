@@ -1,42 +1,396 @@
-from typing import List, Optional, Tuple, Union
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
 import os
+import io
+import itertools
 import json
+import threading
+import time
 import numpy as np
 import pandas as pd
 from pathlib import Path
 
 
-def _parse_data(file: str) -> List[str]:
-    data = []
+def _read_header(file: str) -> List[str]:
     with open(file) as f:
-        data = [line.strip().split() for line in f]
-    return data
+        return f.readline().split()
 
 
-def _parse_json_dict(file: str):
+def _read_tabular(file: str) -> pd.DataFrame:
+    ## whitespace-separated, parsed by pandas' C engine: numeric columns come out as
+    # float64 / int64 (eg %eval_id), text ones (eg interface) as strings
+    return pd.read_csv(file, sep=r"\s+", engine="c")
 
+
+def _sidecar_paths(file: Path) -> Tuple[Path, Path]:
+    return file.with_name(file.name + ".npy"), file.with_name(file.name + ".meta.json")
+
+
+def _load_sidecar(file: Path) -> Optional[pd.DataFrame]:
+    """DataFrame from the binary sidecar of file, if it is up to date (same size and mtime)"""
+    npy_path, meta_path = _sidecar_paths(file)
+    if not (npy_path.exists() and meta_path.exists()):
+        return None
+    meta = json.loads(meta_path.read_text())
+    stat = file.stat()
+    if meta["size"] != stat.st_size or meta["mtime_ns"] != stat.st_mtime_ns:
+        return None
+    values = np.load(npy_path, mmap_mode="r")
+    columns = {}
+    for j, (column, dtype) in enumerate(meta["dtypes"].items()):
+        if dtype == "category":
+            categories = np.asarray(meta["categories"][column], dtype=object)
+            codes = values[:, j]
+            missing = np.isnan(codes)  # missing values are stored as NaN codes
+            columns[column] = np.full(len(codes), np.nan, dtype=object)
+            columns[column][~missing] = categories[codes[~missing].astype(np.intp)]
+        else:
+            columns[column] = values[:, j].astype(dtype, copy=False)
+    return pd.DataFrame(columns, columns=meta["columns"])
+
+
+def _write_sidecar(file: Path, df: pd.DataFrame):
+    """Store df as a single (memory-mappable) float64 .npy matrix, with text columns as category
+    codes (NaN for missing values)"""
+    npy_path, meta_path = _sidecar_paths(file)
+    stat = file.stat()
+    values = np.empty(df.shape, dtype=np.float64, order="F")  # contiguous columns
+    dtypes, categories = {}, {}
+    for j, column in enumerate(df.columns):
+        if pd.api.types.is_numeric_dtype(df[column]):
+            values[:, j] = df[column].to_numpy(dtype=np.float64)
+            dtypes[column] = str(df[column].dtype)
+        else:
+            codes, uniques = pd.factorize(df[column])
+            values[:, j] = np.where(codes >= 0, codes, np.nan)  # factorize codes NaN as -1
+            dtypes[column] = "category"
+            categories[column] = [str(u) for u in uniques]
+    meta = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "columns": list(df.columns),
+        "dtypes": dtypes,
+        "categories": categories,
+    }
+    ## write to temporary files first, so that concurrent readers never see partial sidecars
+    tmp_npy = npy_path.with_name(npy_path.name + ".tmp")
+    with open(tmp_npy, "wb") as f:
+        np.save(f, values)
+    os.replace(tmp_npy, npy_path)
+    tmp_meta = meta_path.with_name(meta_path.name + ".tmp")
+    tmp_meta.write_text(json.dumps(meta))
+    os.replace(tmp_meta, meta_path)
+
+
+def _load_tabular(file: Path, cache: bool = False) -> pd.DataFrame:
+    if cache:
+        df = _load_sidecar(file)
+        if df is not None:
+            return df
+    df = _read_tabular(file)
+    if cache:
+        _write_sidecar(file, df)
+    return df
+
+
+class TabularFileFollower:
+    """Follows a Dakota tabular file (eg 'results.dat') while the study writing it runs:
+    keeps a byte offset, and on each read only parses the complete lines appended since the
+    previous one - so checking progress costs O(new rows), not a reread of the whole file.
+    A partially written last line is left for the next read; if the file shrinks (eg a new
+    study overwrote it), it is followed again from its start.
+
+    New rows come as DataFrames with fixed dtypes (those of the first rows read: text columns
+    such as interface as str, %eval_id as int64, the others as float64), either by calling
+    `read_new`, by iterating (blocking until `stop` or idle_timeout), or by a callback called
+    from a background thread (`start` / `stop`), which does not block `study.execute()`.
+
+    Args:
+        file: Tabular file to follow - it does not need to exist yet.
+        poll_interval (float, optional): Seconds between checks for new data.
+        idle_timeout (float, optional): Stop iterating after this many seconds without new rows.
+    """
+
+    def __init__(
+        self,
+        file: Union[str, Path],
+        poll_interval: float = 0.5,
+        idle_timeout: Optional[float] = None,
+    ):
+        self.path = Path(file)
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.columns: Optional[List[str]] = None
+        self.n_rows = 0
+        self._offset = 0
+        self._dtypes: Optional[Dict[str, str]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _reset(self):
+        self.columns, self._dtypes = None, None
+        self.n_rows, self._offset = 0, 0
+
+    def read_new(self) -> Optional[pd.DataFrame]:
+        """Rows appended since the last read (None if there are none)"""
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            return None
+        if size < self._offset:
+            print(f"{self.path} was truncated - following it from its start")
+            self._reset()
+        if size == self._offset:
+            return None
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(size - self._offset)
+        end = data.rfind(b"\n") + 1  # only complete lines
+        if end == 0:
+            return None
+        data = data[:end]
+        self._offset += end
+
+        if self.columns is None:
+            header_end = data.index(b"\n") + 1
+            self.columns = data[:header_end].decode().split()
+            data = data[header_end:]
+        if not data.strip():
+            return None
+        df = pd.read_csv(
+            io.BytesIO(data),
+            sep=r"\s+",
+            engine="c",
+            header=None,
+            names=self.columns,
+            dtype=self._dtypes,
+        )
+        if self._dtypes is None:
+            ## fixed from the first rows on, so that all chunks have the same dtypes
+            self._dtypes = {
+                c: "int64" if c == r"%eval_id" else "float64" if is_numeric else str
+                for c, is_numeric in (
+                    (c, pd.api.types.is_numeric_dtype(df[c])) for c in df.columns
+                )
+            }
+            df = df.astype(self._dtypes)
+        self.n_rows += len(df)
+        return df
+
+    def __iter__(self) -> Iterator[pd.DataFrame]:
+        last_data = time.monotonic()
+        while True:
+            df = self.read_new()
+            if df is not None:
+                last_data = time.monotonic()
+                yield df
+                continue
+            if self._stop.is_set():
+                return
+            if self.idle_timeout is not None and time.monotonic() - last_data > self.idle_timeout:
+                return
+            self._stop.wait(self.poll_interval)
+
+    def start(self, callback: Callable[[pd.DataFrame], None]) -> "TabularFileFollower":
+        """Call callback(new_rows) from a background (daemon) thread, until `stop`"""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=lambda: [callback(df) for df in self], daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop following - the rows written before the call are still delivered"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+## FIXME manual fix kept as default, the output keys can now be chosen by the caller
+DEFAULT_JSON_OUTPUT_KEYS = {"AFmax_4um": "-AFpeak"}
+JsonKeys = Optional[Union[List[str], Dict[str, str]]]
+
+
+class _JsonStream:
+    """Incremental reader of a JSON text: values are decoded one at a time from a buffer
+    that only ever holds (about) the value being decoded, refilled from the file in chunks."""
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _read_more(self, size: int) -> bool:
+        if self.eof:
+            return False
+        chunk = self.f.read(size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character (consumed only through `expect`)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._read_more(self.chunk_size):
+                return self.buf[self.pos : self.pos + 1]
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError(f"Invalid JSON: expected one of '{chars}', got '{c}'")
+        self.pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                ## a number at the end of the buffer might continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read_more(size)
+            size *= 2  # avoid re-decoding large values too many times
+
+
+def _iter_json_tasks(file: str, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    """Yield the elements of the top-level "tasks" list of a JSON export, one at a time,
+    without loading the whole file in memory"""
     with open(file) as f:
-        data_dict = json.load(f)["tasks"]
+        stream = _JsonStream(f, chunk_size)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            key = stream.value()
+            stream.expect(":")
+            if key == "tasks":
+                stream.expect("[")
+                if stream.peek() == "]":
+                    stream.expect("]")
+                else:
+                    while True:
+                        yield stream.value()
+                        if stream.expect(",]") == "]":
+                            break
+            else:
+                stream.value()  # skip other entries
+            if stream.expect(",}") == "}":
+                return
+
+
+def _get_json_keys(
+    task: dict, input_keys: JsonKeys = None, output_keys: JsonKeys = None
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """{key in the task: column name} for inputs (defaults to all of them) and outputs
+    (defaults to DEFAULT_JSON_OUTPUT_KEYS)"""
 
-    columns = list(data_dict[0]["input"]["InputFile1"]["value"].keys())
-    ## FIXME manual fix, we should be using all output keys
-    # columns += list(data_dict[0]["output"]["OutputFile1"]["value"].keys())
-    columns += ["-AFpeak"]
+    def as_dict(keys: Union[List[str], Dict[str, str]]) -> Dict[str, str]:
+        return dict(keys) if isinstance(keys, dict) else {k: k for k in keys}
 
-    data = []
-    for d in data_dict:
-        input_data = list(d["input"]["InputFile1"]["value"].values())
-        ## FIXME manual fix, we should be using all output keys
-        # output_data = list(d["output"]["OutputFile1"]["value"].values())
-        output_data = [d["output"]["OutputFile1"]["value"]["AFmax_4um"]]
+    if input_keys is None:
+        input_keys = list(task["input"]["InputFile1"]["value"].keys())
+    if output_keys is None:
+        output_keys = DEFAULT_JSON_OUTPUT_KEYS
+    return as_dict(input_keys), as_dict(output_keys)
 
-        data.append(input_data + output_data)
 
-    return columns, data
+def _iter_json_blocks(
+    file: str,
+    input_keys: JsonKeys = None,
+    output_keys: JsonKeys = None,
+    block_size: int = 65536,
+) -> Iterator[Tuple[List[str], np.ndarray]]:
+    """Stream the tasks of a JSON export as (columns, block) pairs, each block being a
+    preallocated (at most block_size x n_columns) float array (see `_parse_json_dict` for keys)"""
+    tasks = _iter_json_tasks(file)
+    first = next(tasks, None)
+    if first is None:
+        raise ValueError(f"File {file} has no tasks")
+    input_keys, output_keys = _get_json_keys(first, input_keys, output_keys)
+    columns = list(input_keys.values()) + list(output_keys.values())
+    n_inputs = len(input_keys)
 
+    block = np.empty((block_size, len(columns)))
+    n = 0
+    for task in itertools.chain([first], tasks):
+        inputs = task["input"]["InputFile1"]["value"]
+        outputs = task["output"]["OutputFile1"]["value"]
+        block[n, :n_inputs] = [inputs[k] for k in input_keys]
+        block[n, n_inputs:] = [outputs[k] for k in output_keys]
+        n += 1
+        if n == block_size:
+            yield columns, block
+            block = np.empty((block_size, len(columns)))
+            n = 0
+    if n:
+        yield columns, block[:n]
 
-def process_json_file(file: str) -> str:
-    columns, data = _parse_json_dict(file)
+
+def _parse_json_dict(
+    file: str,
+    input_keys: JsonKeys = None,
+    output_keys: JsonKeys = None,
+) -> Tuple[List[str], np.ndarray]:
+    """Stream the tasks of a JSON export into a (n_tasks x n_columns) float array.
+
+    Args:
+        input_keys / output_keys (optional): Keys of tasks[*].input.InputFile1.value /
+            tasks[*].output.OutputFile1.value to use as columns. Either a list, or a dict
+            {key: column name} to rename them. Default to all input keys, and to
+            DEFAULT_JSON_OUTPUT_KEYS ("AFmax_4um", renamed "-AFpeak") for the outputs.
+    """
+    blocks = list(_iter_json_blocks(file, input_keys, output_keys))
+    return blocks[0][0], np.concatenate([block for _, block in blocks])
+
+
+def _iter_file_chunks(
+    file: Path,
+    chunk_size: int,
+    json_input_keys: JsonKeys = None,
+    json_output_keys: JsonKeys = None,
+) -> Iterator[pd.DataFrame]:
+    """DataFrames of (at most) chunk_size rows of a DAT / TXT / JSON / CSV file"""
+    _, ext = os.path.splitext(file)
+    if ext == ".dat" or ext == ".txt":
+        with pd.read_csv(file, sep=r"\s+", engine="c", chunksize=chunk_size) as reader:
+            yield from reader
+    elif ext == ".json":
+        for columns, block in _iter_json_blocks(
+            file, json_input_keys, json_output_keys, block_size=chunk_size
+        ):
+            yield pd.DataFrame(block, columns=columns)
+    elif ext == ".csv":
+        with pd.read_csv(file, chunksize=chunk_size) as reader:
+            yield from reader
+    else:
+        raise ValueError(f"File {file} is not a DAT / TXT / JSON / CSV file")
+
+
+def process_json_file(
+    file: str, input_keys: JsonKeys = None, output_keys: JsonKeys = None
+) -> str:
+    columns, data = _parse_json_dict(file, input_keys, output_keys)
     df = pd.DataFrame(data, columns=columns)
     df[r"%eval_id"] = np.arange(1, len(df) + 1)
     df = df[
@@ -48,24 +402,37 @@ def process_json_file(file: str) -> str:
     return processed_file
 
 
-def get_variable_names(file: str) -> List[str]:
+def get_variable_names(
+    file: str, json_input_keys: JsonKeys = None, json_output_keys: JsonKeys = None
+) -> List[str]:
     file = Path(file)
     assert file.exists(), f"File {file} does not exist"
     _, ext = os.path.splitext(file)
     if ext == ".dat" or ext == ".txt":
-        lines = _parse_data(file)
-        return lines[0]
+        return _read_header(file)
     elif ext == ".json":
-        columns, data = _parse_json_dict(file)
-        return columns
+        ## only the first task is needed
+        first = next(_iter_json_tasks(file), None)
+        assert first is not None, f"File {file} has no tasks"
+        input_keys, output_keys = _get_json_keys(first, json_input_keys, json_output_keys)
+        return list(input_keys.values()) + list(output_keys.values())
     elif ext == ".csv":
-        df = pd.read_csv(file)
-        return df.columns.tolist()
+        return pd.read_csv(file, nrows=0).columns.tolist()  # header only
     else:
         raise ValueError(f"File {file} is not a DAT / TXT / JSON / CSV file")
 
 
-def load_data(files: List[Path]) -> pd.DataFrame:
+def load_data(
+    files: List[Path],
+    cache: bool = False,
+    json_input_keys: JsonKeys = None,
+    json_output_keys: JsonKeys = None,
+) -> pd.DataFrame:
+    """Load (and concatenate) DAT / TXT / JSON / CSV files into a DataFrame.
+    If cache, DAT / TXT files are stored in a binary sidecar (<file>.npy + <file>.meta.json)
+    next to them, which is used instead of parsing as long as the file size and mtime match.
+    For JSON files, json_input_keys / json_output_keys select the columns (see `_parse_json_dict`).
+    """
     dfs = []
     if isinstance(files, (str, Path)):
         files = [files]
@@ -75,10 +442,9 @@ def load_data(files: List[Path]) -> pd.DataFrame:
         assert file.exists(), f"File {file} does not exist"
         _, ext = os.path.splitext(file)
         if ext == ".dat" or ext == ".txt":
-            lines = _parse_data(file)
-            dfs.append(pd.DataFrame(lines[1:], columns=lines[0]))
+            dfs.append(_load_tabular(file, cache=cache))
         elif ext == ".json":
-            columns, data = _parse_json_dict(file)
+            columns, data = _parse_json_dict(file, json_input_keys, json_output_keys)
             dfs.append(pd.DataFrame(data=data, columns=columns))
         elif ext == ".csv":
             dfs.append(pd.read_csv(file))
@@ -89,6 +455,97 @@ def load_data(files: List[Path]) -> pd.DataFrame:
     return df
 
 
+def _check_same_columns(files: List[Path]):
+    """Raise if the files do not all have the same columns (in any order) - concatenating them
+    would otherwise fill (or drop) the columns missing from some files"""
+    columns = [get_variable_names(file) for file in files]
+    for file, file_columns in zip(files[1:], columns[1:]):
+        if set(file_columns) != set(columns[0]):
+            raise ValueError(
+                f"Columns of {file} differ from those of {files[0]}: "
+                f"missing {sorted(set(columns[0]) - set(file_columns))}, "
+                f"extra {sorted(set(file_columns) - set(columns[0]))}"
+            )
+
+
+def _keep_rows(keep_idxs, positions: np.ndarray) -> np.ndarray:
+    """Mask of the rows at positions to keep - keep_idxs is either a boolean mask or row positions"""
+    keep_idxs = np.asarray(keep_idxs)
+    if keep_idxs.dtype == bool:
+        return keep_idxs[positions]
+    return np.isin(positions, keep_idxs)
+
+
+def _process_input_file_streaming(
+    files: List[Path],
+    processed_file: str,
+    columns_to_remove: List[str],
+    N: Optional[int],
+    keep_idxs: Optional[List[int]],
+    filter_N: Optional[int],
+    highest: bool,
+    output_variable: Optional[str],
+    chunk_size: int,
+):
+    n_rows = 0
+    columns: Optional[List[str]] = None
+    best: Optional[pd.DataFrame] = None  # top / bottom filter_N rows seen so far
+    n_written = 0
+
+    def write(df: pd.DataFrame):
+        nonlocal n_written
+        df.to_csv(
+            processed_file,
+            sep=" ",
+            index=False,
+            header=n_written == 0,
+            mode="w" if n_written == 0 else "a",
+        )
+        n_written += len(df)
+
+    for file in files:
+        for chunk in _iter_file_chunks(Path(file), chunk_size):
+            if columns is None:
+                for c in columns_to_remove:
+                    if c not in chunk.columns:
+                        print(f"Column {c} not found in the dataframe")
+                columns = [c for c in chunk.columns if c not in columns_to_remove]
+                if filter_N is not None and output_variable is None:
+                    output_variable = columns[-1]
+            chunk = chunk.reindex(columns=columns)
+            if N is not None:
+                chunk = chunk.iloc[: N - n_rows]
+            positions = np.arange(n_rows, n_rows + len(chunk))
+            if r"%eval_id" in chunk.columns:
+                chunk[r"%eval_id"] = positions + 1
+            n_rows += len(chunk)
+
+            if filter_N is not None:
+                ## only the best filter_N rows have to be kept in memory
+                candidates = pd.concat([best, chunk]) if best is not None else chunk
+                if highest:
+                    best = candidates.nlargest(filter_N, output_variable, keep="first")
+                else:
+                    best = candidates.nsmallest(filter_N, output_variable, keep="first")
+            elif keep_idxs is not None:
+                write(chunk[_keep_rows(keep_idxs, positions)])
+            else:
+                write(chunk)
+            if N is not None and n_rows >= N:
+                break
+        if N is not None and n_rows >= N:
+            break
+
+    if best is not None:
+        if keep_idxs is not None:
+            best = best[_keep_rows(keep_idxs, np.arange(len(best)))]
+        write(best)
+    elif n_written == 0:
+        write(pd.DataFrame(columns=columns))  # at least the header
+    if keep_idxs is not None:
+        print(f"Keeping only {n_written} rows (of {min(n_rows, filter_N or n_rows)})")
+
+
 def process_input_file(
     files: Union[Path, List[Path]],
     columns_to_remove: List[str] = ["interface"],
@@ -96,9 +553,46 @@ def process_input_file(
     keep_idxs: Optional[List[int]] = None,
     filter_highest_N: Optional[int] = None,
     output_variable: Optional[str] = None,
+    filter_lowest_N: Optional[int] = None,
+    chunk_size: Optional[int] = None,
 ) -> str:
+    """Merge input files into a single (Dakota-annotated) "_processed.txt" file, renumbering %eval_id.
+
+    Args:
+        N (optional): Only take the first N rows.
+        filter_highest_N / filter_lowest_N (optional): Only keep the N rows with the highest /
+            lowest output_variable (defaults to the last column), sorted by it.
+        keep_idxs (optional): Rows to keep, as a boolean mask or row positions, after all the above.
+        chunk_size (optional): If given, files are streamed in chunks of chunk_size rows and the
+            output is written incrementally - memory is bounded by chunk_size (+ filter_*_N rows)
+            instead of the total number of rows.
+    """
     if isinstance(files, (str, Path)):
         files = [files]
+    assert (
+        filter_highest_N is None or filter_lowest_N is None
+    ), "Only one of filter_highest_N / filter_lowest_N can be given"
+    _check_same_columns(files)
+    filter_N = filter_highest_N if filter_highest_N is not None else filter_lowest_N
+    highest = filter_highest_N is not None
+
+    processed_file = (
+        "_".join([os.path.splitext(f)[0] for f in files]) + "_processed.txt"
+    )
+
+    if chunk_size is not None:
+        _process_input_file_streaming(
+            files,
+            processed_file,
+            columns_to_remove,
+            N,
+            keep_idxs,
+            filter_N,
+            highest,
+            output_variable,
+            chunk_size,
+        )
+        return processed_file
 
     df = load_data(files)
 
@@ -114,27 +608,23 @@ def process_input_file(
     # allows to only take the first N rows
     df = df.iloc[:N] if N is not None else df
 
-    if filter_highest_N is not None:
+    if filter_N is not None:
         output_variable = df.columns[-1] if output_variable is None else output_variable
-        df = df.sort_values(by=output_variable, ascending=False).iloc[filter_highest_N:]
+        df = df.sort_values(
+            by=output_variable, ascending=not highest, kind="stable"
+        ).iloc[:filter_N]
 
     ## allow to only keep certain idxs
     if keep_idxs is not None:
         original_len = len(df)
-        df = df[keep_idxs]
+        df = df[_keep_rows(keep_idxs, np.arange(len(df)))]
         print(f"Keeping only {len(df)} rows (of {original_len})")
 
-    processed_file = (
-        "_".join([os.path.splitext(f)[0] for f in files]) + "_processed.txt"
-    )
     df.to_csv(processed_file, sep=" ", index=False)
     return processed_file
 
 
-def get_results(file, key="-AFpeak"):
-    df = load_data(file)
-
-    results = df[key].values
+def get_results(file, key="-AFpeak", cache: bool = False):
+    df = load_data(file, cache=cache)
 
-    results = [float(r) for r in results]
-    return np.array(results)
+    return df[key].to_numpy(dtype=float)
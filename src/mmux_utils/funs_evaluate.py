@@ -1,31 +1,328 @@
 ### Allows to evaluate in different modes - batch, single set, ...
 ### also in OSPARC or local deployment
-from typing import Callable, List
+from typing import Callable, List, Literal, Optional
 from pathlib import Path
-import dakota.environment as dakenv
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import asyncio
 import datetime
+import importlib
+import inspect
+import multiprocessing
 import os
+import threading
+from mmux_utils.funs_pareto import ParetoArchive
 
 
 ## TODO switch to test-based development!!
 
 
+def get_input_vector(input: dict) -> List[float]:
+    """Values of the variables of a Dakota evaluation dict (continuous variables, "cv", if present)"""
+    return list(input["cv"]) if "cv" in input else list(input.values())
+
+
+def get_response_values(response: dict) -> List[float]:
+    """Values of the responses, either as Dakota "fns" or as a {descriptor: value} dict"""
+    return list(response["fns"]) if "fns" in response else list(response.values())
+
+
+def _to_dakota_response(response: dict) -> dict:
+    return {"fns": [v for v in response.values()]}
+
+
+def _update_archive(
+    archive: ParetoArchive, batch_input: List[dict], responses: List[dict]
+):
+    archive.update(
+        [get_response_values(r) for r in responses],
+        [get_input_vector(i) for i in batch_input],
+    )
+
+
+def accepts_on_result(evaluator: Callable) -> bool:
+    """Whether a batch evaluator callback takes an on_result argument (see ParallelBatchEvaluator)"""
+    try:
+        return "on_result" in inspect.signature(evaluator).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _map_with_callback(
+    model: Callable, batch_input: List[dict], on_result: Callable[[int, dict], None]
+) -> List[dict]:
+    responses = []
+    for i, input in enumerate(batch_input):
+        responses.append(model(input))
+        on_result(i, responses[-1])
+    return responses
+
+
 ### Otherwise could create a class that I can instantiate and give a "model" at initialization time,
 # which is given to "run dakota" as input parameter
-def batch_evaluator(model: Callable, batch_input: List[dict]):
-    return map(model, batch_input)  # FIXME not sure this will work
+def batch_evaluator(
+    model: Callable,
+    batch_input: List[dict],
+    archive: Optional[ParetoArchive] = None,
+    on_result: Optional[Callable[[int, dict], None]] = None,
+):
+    if archive is None and on_result is None:
+        return map(model, batch_input)  # FIXME not sure this will work
+    if on_result is not None:
+        responses = _map_with_callback(model, batch_input, on_result)
+    else:
+        responses = list(map(model, batch_input))
+    if archive is not None:
+        _update_archive(archive, batch_input, responses)
+    return responses
 
 
-def batch_evaluator_local(model: Callable, batch_input: List[dict]):
-    return [
-        {"fns": [v for v in response.values()]} for response in map(model, batch_input)
-    ]
+def batch_evaluator_local(
+    model: Callable,
+    batch_input: List[dict],
+    archive: Optional[ParetoArchive] = None,
+    on_result: Optional[Callable[[int, dict], None]] = None,
+):
+    if on_result is not None:
+        responses = _map_with_callback(
+            lambda input: _to_dakota_response(model(input)), batch_input, on_result
+        )
+    else:
+        responses = [_to_dakota_response(response) for response in map(model, batch_input)]
+    if archive is not None:
+        _update_archive(archive, batch_input, responses)
+    return responses
 
 
 def single_evaluator(model: Callable, input: dict):
     return model(input)
 
 
+_WORKER_MODEL: Optional[Callable] = None
+
+
+def _init_worker(model: Callable):
+    ## the model is sent once per worker process, not once per evaluation
+    global _WORKER_MODEL
+    _WORKER_MODEL = model
+
+
+def _evaluate_in_worker(input: dict) -> dict:
+    return _to_dakota_response(_WORKER_MODEL(input))
+
+
+def _evaluate_chunk_in_worker(inputs: List[dict]) -> List[dict]:
+    return [_evaluate_in_worker(input) for input in inputs]
+
+
+class ParallelBatchEvaluator:
+    """Batch evaluator running the model on a pool of threads or processes.
+    Can be given directly to `run_dakota` as evaluator, eg
+        with ParallelBatchEvaluator(model, "process", max_workers=32) as evaluator:
+            run_dakota(dakota_conf_path, evaluator=evaluator)
+
+    Args:
+        model: Takes a Dakota evaluation dict and returns a {descriptor: value} dict.
+            Must be picklable for the "process" executor (eg a module-level function).
+        executor: "thread" for I/O-bound models, "process" for CPU-bound ones.
+        max_workers (optional): Maximum number of concurrent evaluations (defaults to the number of CPUs).
+        chunksize (int, optional): Evaluations sent together to each worker process -
+            larger values reduce overhead for cheap models. Ignored for threads.
+        archive (optional): ParetoArchive fed with every batch of responses.
+        mp_context (str, optional): Multiprocessing start method of the worker processes.
+            "spawn" by default, as forking the (multithreaded) Dakota process is unsafe.
+
+    Results are always returned in the order of batch_input. The pool is created on the first
+    batch and reused for the following ones; call `close` (or use it as context manager) to release it.
+    If on_result is given, it is called (in the calling thread) with the index and response of each
+    evaluation (chunk) as soon as it completes, in completion order - eg to journal it.
+    """
+
+    def __init__(
+        self,
+        model: Callable,
+        executor: Literal["thread", "process"] = "process",
+        max_workers: Optional[int] = None,
+        chunksize: int = 1,
+        archive: Optional[ParetoArchive] = None,
+        mp_context: str = "spawn",
+    ):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor '{executor}', must be 'thread' or 'process'")
+        self.model = model
+        self.executor = executor
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.archive = archive
+        self.mp_context = mp_context
+        self._pool: Optional[Executor] = None
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.executor == "thread":
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.mp_context),
+                    initializer=_init_worker,
+                    initargs=(self.model,),
+                )
+        return self._pool
+
+    def _evaluate_as_completed(
+        self, pool: Executor, batch_input: List[dict], on_result: Callable[[int, dict], None]
+    ) -> List[dict]:
+        if self.executor == "thread":
+            evaluate_chunk, chunksize = (
+                lambda inputs: [_to_dakota_response(self.model(i)) for i in inputs],
+                1,
+            )
+        else:
+            evaluate_chunk, chunksize = _evaluate_chunk_in_worker, self.chunksize
+        futures = {
+            pool.submit(evaluate_chunk, batch_input[start : start + chunksize]): start
+            for start in range(0, len(batch_input), chunksize)
+        }
+        responses: List[Optional[dict]] = [None] * len(batch_input)
+        for future in as_completed(futures):
+            for i, response in enumerate(future.result(), futures[future]):
+                responses[i] = response
+                on_result(i, response)
+        return responses
+
+    def __call__(
+        self,
+        batch_input: List[dict],
+        on_result: Optional[Callable[[int, dict], None]] = None,
+    ) -> List[dict]:
+        pool = self._get_pool()
+        if on_result is not None:
+            responses = self._evaluate_as_completed(pool, batch_input, on_result)
+        elif self.executor == "thread":
+            responses = list(
+                pool.map(lambda i: _to_dakota_response(self.model(i)), batch_input)
+            )
+        else:
+            responses = list(
+                pool.map(_evaluate_in_worker, batch_input, chunksize=self.chunksize)
+            )
+        if self.archive is not None:
+            _update_archive(self.archive, batch_input, responses)
+        return responses
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncBatchEvaluator:
+    """Batch evaluator for latency-bound models (job submission, file polling, ...), written as
+    `async def model(input: dict) -> dict`. Synchronous models are run in threads instead.
+
+    At most max_concurrency evaluations are in flight at any time: a fixed number of workers
+    pull the next input only when one of theirs finishes (backpressure), so batches of thousands
+    of evaluations do not create thousands of pending tasks. Can be given directly to `run_dakota`
+    as (synchronous) evaluator; the evaluations run on an event loop in a background thread,
+    kept alive across batches - call `close` (or use it as context manager) to stop it.
+
+    Args:
+        model: Takes a Dakota evaluation dict and returns a {descriptor: value} dict.
+        max_concurrency (int, optional): Maximum number of evaluations in flight.
+        archive (optional): ParetoArchive fed with every batch of responses.
+
+    As for ParallelBatchEvaluator, an on_result callback can be given with each batch; it is
+    called (from the event loop thread) with the index and response of each completed evaluation.
+    """
+
+    def __init__(
+        self,
+        model: Callable,
+        max_concurrency: int = 64,
+        archive: Optional[ParetoArchive] = None,
+    ):
+        assert max_concurrency > 0, "max_concurrency must be positive"
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.archive = archive
+        self._is_async = inspect.iscoroutinefunction(
+            model
+        ) or inspect.iscoroutinefunction(getattr(model, "__call__", None))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    async def _evaluate(self, input: dict) -> dict:
+        if self._is_async:
+            return await self.model(input)
+        return await asyncio.to_thread(self.model, input)
+
+    async def evaluate(
+        self,
+        batch_input: List[dict],
+        on_result: Optional[Callable[[int, dict], None]] = None,
+    ) -> List[dict]:
+        """Evaluate a batch (from within an event loop), results in the order of batch_input"""
+        responses: List[Optional[dict]] = [None] * len(batch_input)
+        pending = iter(enumerate(batch_input))
+
+        async def worker():
+            for i, input in pending:  # shared iterator: each input is taken only once
+                responses[i] = _to_dakota_response(await self._evaluate(input))
+                if on_result is not None:
+                    on_result(i, responses[i])
+
+        workers = [
+            asyncio.ensure_future(worker())
+            for _ in range(min(self.max_concurrency, len(batch_input)))
+        ]
+        try:
+            await asyncio.gather(*workers)
+        except BaseException:
+            for w in workers:
+                w.cancel()
+            raise
+        return responses
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+            self._thread.start()
+        return self._loop
+
+    def __call__(
+        self,
+        batch_input: List[dict],
+        on_result: Optional[Callable[[int, dict], None]] = None,
+    ) -> List[dict]:
+        future = asyncio.run_coroutine_threadsafe(
+            self.evaluate(batch_input, on_result), self._get_loop()
+        )
+        responses = future.result()
+        if self.archive is not None:
+            _update_archive(self.archive, batch_input, responses)
+        return responses
+
+    def close(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            self._loop, self._thread = None, None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
 def create_run_dir(script_dir: Path, dir_name: str = "sampling"):
     ## part 1 - setup
     main_runs_dir = script_dir / "runs"
@@ -36,17 +333,31 @@ def create_run_dir(script_dir: Path, dir_name: str = "sampling"):
     return temp_dir
 
 
-def run_dakota(dakota_conf_path: Path, batch_mode: bool = True):
+def run_dakota(
+    dakota_conf_path: Path,
+    batch_mode: bool = True,
+    evaluator: Optional[Callable] = None,
+    read_restart: Optional[Path] = None,
+    dakota_module: str = "dakota.environment",
+):
+    """Run a Dakota study. evaluator (eg a ParallelBatchEvaluator) is used as the
+    batch_evaluator callback if batch_mode, as the (single) evaluator callback otherwise.
+    If read_restart is given, the evaluations in that Dakota restart file are not repeated.
+    dakota_module provides `study` - eg "mmux_utils.funs_fake_dakota" to run without Dakota."""
+    ## imported here, so that the evaluators can be used (and spawned) without loading Dakota
+    dakenv = importlib.import_module(dakota_module)
+
     print("Starting dakota")
     dakota_conf = dakota_conf_path.read_text()
     callbacks = (
-        {"batch_evaluator": batch_evaluator}
+        {"batch_evaluator": evaluator or batch_evaluator}
         if batch_mode
-        else {"evaluator": single_evaluator}  # not sure this will work
+        else {"evaluator": evaluator or single_evaluator}  # not sure this will work
     )
     study = dakenv.study(
         callbacks=callbacks,
         input_string=dakota_conf,
+        read_restart=str(read_restart) if read_restart is not None else "",
     )
     study.execute()
     ## TODO access documentation of dakenv.study -- cannot, also cannot find in https://github.com/snl-dakota/dakota/tree/devel/packages
@@ -0,0 +1,135 @@
+### Local stand-in for `dakota.environment` - to test and benchmark the Python side of studies
+### (callbacks, run directories, tabular output) without a Dakota installation.
+### It does not optimize anything: it samples the variables uniformly within their bounds.
+from typing import Callable, List, Optional
+import re
+import numpy as np
+
+
+_BLOCKS = ("environment", "method", "model", "variables", "interface", "responses")
+
+
+def _block(text: str, keyword: str) -> str:
+    """Text of the first `keyword` block of a Dakota input (up to the next block keyword)"""
+    match = re.search(rf"^\s*{keyword}\b", text, flags=re.MULTILINE)
+    if match is None:
+        return ""
+    rest = text[match.end() :]
+    others = "|".join(b for b in _BLOCKS if b != keyword)
+    end = re.search(rf"^\s*(?:{others})\b", rest, flags=re.MULTILINE)
+    return rest[: end.start()] if end else rest
+
+
+def _find_list(keyword: str, text: str) -> Optional[List[str]]:
+    match = re.search(rf"\b{keyword}\b[ \t]*=?[ \t]*([^\n#]*)", text)
+    return [v.strip("'\"") for v in match.group(1).split()] if match else None
+
+
+def _find_int(keyword: str, text: str) -> Optional[int]:
+    match = re.search(rf"\b{keyword}\b\s*=?\s*(\d+)", text)
+    return int(match.group(1)) if match else None
+
+
+class study:
+    """Mimics `dakota.environment.study`: same constructor, `execute` calls the Python
+    callback(s) on uniformly sampled points and writes the tabular data file (if any)."""
+
+    def __init__(
+        self,
+        callbacks: Optional[dict] = None,
+        input_string: str = "",
+        read_restart: str = "",
+        callback: Optional[Callable] = None,
+    ):
+        self.callbacks = callbacks if callbacks is not None else {"evaluator": callback}
+        self.input_string = input_string
+        self.read_restart = read_restart
+        self._variables: List[List[float]] = []
+        self._responses: List[List[float]] = []
+
+    def _parse(self):
+        text = self.input_string
+        variables_block = _block(text, "variables")
+        n_variables = _find_int(r"continuous_(?:design|state)", variables_block) or 1
+        variables = _find_list("descriptors", variables_block) or []
+        if len(variables) != n_variables:
+            variables = [f"x{j + 1}" for j in range(n_variables)]
+        lower = _find_list("lower_bounds", variables_block) or [0.0] * n_variables
+        upper = _find_list("upper_bounds", variables_block) or [1.0] * n_variables
+
+        responses_block = _block(text, "responses")
+        n_responses = _find_int("objective_functions", responses_block) or _find_int(
+            "response_functions", responses_block
+        )
+        responses = _find_list("descriptors", responses_block) or []
+        if n_responses is None:
+            n_responses = max(len(responses), 1)
+        if len(responses) != n_responses:
+            responses = [f"f{j + 1}" for j in range(n_responses)]
+
+        method_block = _block(text, "method")
+        n_samples = (
+            _find_int("samples", method_block)
+            or _find_int("max_function_evaluations", method_block)
+            or 10
+        )
+        batch_size = _find_int("population_size", method_block) or 32
+        seed = _find_int("seed", method_block)
+        tabular_file = _find_list("tabular_data_file", _block(text, "environment"))
+        return (
+            variables,
+            np.asarray(lower, dtype=float),
+            np.asarray(upper, dtype=float),
+            responses,
+            n_samples,
+            batch_size,
+            seed,
+            tabular_file[0] if tabular_file else None,
+        )
+
+    def execute(self):
+        (
+            variables,
+            lower,
+            upper,
+            responses,
+            n_samples,
+            batch_size,
+            seed,
+            tabular_file,
+        ) = self._parse()
+        rng = np.random.default_rng(seed)
+        X = lower + rng.random((n_samples, len(variables))) * (upper - lower)
+        inputs = [
+            {
+                "eval_id": i + 1,
+                "cv": list(x),
+                "cv_labels": variables,
+                "functions": len(responses),
+                "function_labels": responses,
+                "asv": [1] * len(responses),
+            }
+            for i, x in enumerate(X.tolist())
+        ]
+        if self.callbacks.get("batch_evaluator") is not None:
+            outputs = []
+            for start in range(0, n_samples, batch_size):
+                outputs += list(
+                    self.callbacks["batch_evaluator"](inputs[start : start + batch_size])
+                )
+        else:
+            outputs = [self.callbacks["evaluator"](i) for i in inputs]
+        self._variables = X.tolist()
+        self._responses = [list(o["fns"]) for o in outputs]
+
+        if tabular_file is not None:
+            with open(tabular_file, "w") as f:
+                f.write(" ".join(["%eval_id", "interface"] + variables + responses) + "\n")
+                for i, (x, y) in enumerate(zip(self._variables, self._responses)):
+                    f.write(" ".join([str(i + 1), "NO_ID"] + [repr(v) for v in x + y]) + "\n")
+
+    def variables_results(self) -> List[List[float]]:
+        return self._variables
+
+    def response_results(self) -> List[List[float]]:
+        return self._responses
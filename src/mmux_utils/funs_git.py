@@ -1,39 +1,308 @@
-import git
+from typing import Callable, Dict, Literal, Optional, Tuple
+from types import ModuleType
+import hashlib
+import io
+import importlib.util
+import os
+import re
 import sys
-import importlib
+import tarfile
+import threading
+import time
 from pathlib import Path
 
+## bare mirrors of the model repositories, shared by all runs (see `get_mirror`)
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "mmux_utils" / "repos"
 
-def clone_repo(repo_url, commit_hash, run_dir):
-    repo_path = run_dir / repo_url.split("/")[-1]
-    git.Repo.clone_from(repo_url, repo_path)
-    repo = git.Repo(repo_path)
-    repo.git.checkout(commit_hash)
+
+class _FileLock:
+    """Inter-process lock: an OS lock (fcntl.flock, msvcrt.locking on Windows) on a lock file.
+    The OS releases it when the holding process dies, so a lock can never be left stale, and
+    nothing has to break it - the lock file itself is kept. Threads of a process are serialized
+    too, as each acquisition opens the file anew."""
+
+    def __init__(self, path: Path, timeout: float = 600.0):
+        self.path = Path(path)
+        self.timeout = timeout
+        self._file = None
+
+    @staticmethod
+    def _try_lock(f) -> bool:
+        try:
+            if os.name == "nt":
+                import msvcrt
+
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:  # held by someone else
+            return False
+
+    def __enter__(self):
+        start = time.monotonic()
+        f = open(self.path, "a+b")
+        while not self._try_lock(f):
+            if time.monotonic() - start > self.timeout:
+                f.close()
+                raise TimeoutError(f"Could not acquire {self.path} in {self.timeout}s")
+            time.sleep(0.1)
+        self._file = f
+        return self
+
+    def __exit__(self, *exc):
+        f, self._file = self._file, None
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+        f.close()
+
+
+def _mirror_path(repo_url: str, cache_dir: Path) -> Path:
+    name = repo_url.rstrip("/").split("/")[-1].removesuffix(".git")
+    url_hash = hashlib.sha1(repo_url.encode()).hexdigest()[:12]
+    return cache_dir / f"{name}-{url_hash}.git"
+
+
+def _is_full_sha(commit_hash: Optional[str]) -> bool:
+    return commit_hash is not None and re.fullmatch(r"[0-9a-fA-F]{40}", commit_hash) is not None
+
+
+def _has_commit(mirror, commit_hash: str) -> bool:
+    import git
+
+    try:
+        mirror.git.cat_file("-e", f"{commit_hash}^{{commit}}")
+        return True
+    except git.GitCommandError:
+        return False
+
+
+def get_mirror(
+    repo_url: str, commit_hash: Optional[str] = None, cache_dir: Optional[Path] = None
+) -> Path:
+    """Path of the bare mirror of repo_url in cache_dir, cloned on first use. If commit_hash is
+    a full (40 hex digits) commit SHA, the mirror is only fetched if it does not have it yet -
+    not at all in the usual case of re-running a known commit. Any other ref (branch, tag,
+    abbreviated SHA) can move, so the mirror is then always fetched. Concurrent calls (threads
+    or processes) for the same repo are serialized by a lock file next to the mirror."""
+    import git
+
+    cache_dir = Path(cache_dir) if cache_dir is not None else DEFAULT_CACHE_DIR
+    mirror_path = _mirror_path(repo_url, cache_dir)
+    ## fast path, without locking: reading objects while another process fetches is safe
+    if _is_full_sha(commit_hash) and (mirror_path / "HEAD").exists():
+        if _has_commit(git.Repo(mirror_path), commit_hash):
+            return mirror_path
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with _FileLock(mirror_path.with_name(mirror_path.name + ".lock")):
+        cloned = False
+        if not (mirror_path / "HEAD").exists():
+            ## cloned aside then renamed, so that the fast path never sees a partial mirror
+            tmp_path = mirror_path.with_name(f"{mirror_path.name}.tmp{os.getpid()}")
+            git.Repo.clone_from(repo_url, tmp_path, mirror=True)
+            os.replace(tmp_path, mirror_path)
+            cloned = True
+        mirror = git.Repo(mirror_path)
+        if commit_hash is not None and (
+            (not _is_full_sha(commit_hash) and not cloned)
+            or not _has_commit(mirror, commit_hash)
+        ):
+            mirror.git.fetch("--prune", "origin")
+            if not _has_commit(mirror, commit_hash):
+                raise ValueError(f"Commit {commit_hash} not found in {repo_url}")
+    return mirror_path
+
+
+def clone_repo(
+    repo_url,
+    commit_hash,
+    run_dir,
+    cache_dir: Optional[Path] = None,
+    export: Literal["worktree", "archive", "clone"] = "worktree",
+):
+    """Make the files of repo_url at commit_hash available in run_dir / <repo name>.
+
+    By default, objects come from a local bare mirror (see `get_mirror`), so the history is not
+    copied again for every run: "worktree" adds a detached git worktree of the mirror (still a
+    git checkout, eg for `get_commit_hash`), "archive" only extracts the files. "clone" does a
+    full clone of repo_url, without any cache.
+    """
+    import git  # gitpython is only needed (and imported) when actually cloning
+
+    repo_path = Path(run_dir) / repo_url.split("/")[-1]
+    if export == "clone":
+        git.Repo.clone_from(repo_url, repo_path)
+        repo = git.Repo(repo_path)
+        repo.git.checkout(commit_hash)
+        return repo_path
+
+    cache_dir = Path(cache_dir) if cache_dir is not None else DEFAULT_CACHE_DIR
+    mirror_path = get_mirror(repo_url, commit_hash, cache_dir)
+    mirror = git.Repo(mirror_path)
+    if export == "worktree":
+        ## worktrees are registered in the mirror, so adding them is serialized too
+        with _FileLock(mirror_path.with_name(mirror_path.name + ".lock")):
+            mirror.git.worktree("prune")  # forget the worktrees of deleted run dirs
+            mirror.git.worktree("add", "--detach", str(Path(repo_path).resolve()), commit_hash)
+    elif export == "archive":
+        archive = io.BytesIO()
+        mirror.archive(archive, treeish=commit_hash)
+        archive.seek(0)
+        with tarfile.open(fileobj=archive) as tar:
+            tar.extractall(repo_path, filter="data")
+    else:
+        raise ValueError(f"Unknown export '{export}', must be worktree, archive or clone")
     return repo_path
 
 
-def import_function_from_repo(repo_path: Path, module_name: str, function_name: str):
+def get_commit_hash(repo_path: Path) -> str:
+    """Commit checked out in repo_path - eg to identify the model in `funs_cache.EvaluationCache`"""
+    import git
+
+    return git.Repo(repo_path).head.commit.hexsha
+
+
+def _find_commit(repo_path: Path) -> Optional[str]:
+    """Commit checked out in repo_path, None if it is not a git checkout (eg an archive export)"""
+    import git
+
+    try:
+        return get_commit_hash(repo_path)
+    except (git.InvalidGitRepositoryError, git.NoSuchPathError, ValueError):
+        return None
+
+
+def _checked_commit(repo_path: Path, commit_hash: Optional[str]) -> Optional[str]:
+    """Full SHA of the commit checked out in repo_path, checked against commit_hash - any ref,
+    eg a short SHA or a branch name, as for `clone_repo`. If repo_path is not a git checkout,
+    commit_hash is returned as given."""
+    import git
+
+    checked_out = _find_commit(repo_path)
+    if checked_out is None:
+        return commit_hash
+    if commit_hash is not None:
+        try:
+            resolved = git.Repo(repo_path).commit(commit_hash).hexsha
+        except (git.BadName, git.BadObject, ValueError):
+            raise ValueError(f"Unknown commit {commit_hash} in {repo_path}")
+        if resolved != checked_out:
+            raise ValueError(f"{repo_path} is at commit {checked_out}, not {commit_hash}")
+    return checked_out
+
+
+## loaded model modules, per process: (repo path, commit, module) -> module
+_MODULES: Dict[Tuple[str, Optional[str], str], ModuleType] = {}
+_MODULES_LOCK = threading.RLock()
+
+
+def _load_module(repo_path: Path, module_name: str, commit_hash: Optional[str]) -> ModuleType:
+    key = (str(Path(repo_path).resolve()), commit_hash, module_name)
+    with _MODULES_LOCK:
+        if key in _MODULES:
+            return _MODULES[key]
+        ## a unique name per version, registered in sys.modules (eg so that classes and
+        # functions defined in the module can be pickled), instead of a shared "loaded_module"
+        unique_name = "mmux_model_" + hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        spec = importlib.util.spec_from_file_location(
+            unique_name, str(Path(repo_path) / module_name)
+        )
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[unique_name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[unique_name]
+            raise
+        _MODULES[key] = module
+        return module
+
+
+def import_function_from_repo(
+    repo_path: Path,
+    module_name: str,
+    function_name: str,
+    commit_hash: Optional[str] = None,
+):
     """
     Import a specific function from a module within the cloned repo.
+    Modules are loaded once per (repo path, commit, module) and process; later calls reuse them.
 
     Args:
     - repo_path: Path to the cloned repository.
     - module_path: Relative path to the module (e.g., "evaluate.py").
     - function_name: Name of the function to import.
+    - commit_hash (optional): Commit (any ref) expected in repo_path; read from the checkout
+      if not given.
 
     Returns:
     - The imported function.
     """
-    # Construct the full module path
-    full_module_path = repo_path / module_name
-
-    # Load the module
-    spec = importlib.util.spec_from_file_location(
-        "loaded_module", str(full_module_path)
-    )
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
+    repo_path = Path(repo_path)
+    ## keyed on the full SHA, so that one commit given as different refs is loaded once
+    module = _load_module(repo_path, module_name, _checked_commit(repo_path, commit_hash))
 
     # Get the function from the module
     func = getattr(module, function_name)
     return func
+
+
+class ModelFunctionHandle:
+    """Picklable reference to a model function in a (cloned) repo: only the location is pickled,
+    and the function is imported the first time the handle is called in each process - then
+    reused, as are the modules shared by several handles (see `import_function_from_repo`).
+    So it can be given as model to a ParallelBatchEvaluator, and handles of several commits
+    can run side by side.
+
+    Args:
+        repo_path: Path to the cloned repository (eg from `clone_repo`).
+        module_name: Relative path to the module (e.g., "evaluate.py").
+        function_name: Name of the function.
+        commit_hash (optional): Commit (any ref) expected in repo_path; stored as the full SHA
+            of the checkout.
+    """
+
+    def __init__(
+        self,
+        repo_path: Path,
+        module_name: str,
+        function_name: str,
+        commit_hash: Optional[str] = None,
+    ):
+        self.repo_path = Path(repo_path).resolve()
+        self.module_name = module_name
+        self.function_name = function_name
+        self.commit_hash = _checked_commit(self.repo_path, commit_hash)
+        self._function: Optional[Callable] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_function"] = None
+        return state
+
+    def resolve(self) -> Callable:
+        if self._function is None:
+            self._function = import_function_from_repo(
+                self.repo_path, self.module_name, self.function_name, self.commit_hash
+            )
+        return self._function
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return (
+            f"ModelFunctionHandle({str(self.repo_path)!r}, {self.module_name!r}, "
+            f"{self.function_name!r}, commit_hash={self.commit_hash!r})"
+        )
@@ -1,9 +1,10 @@
 import numpy as np
+import pandas as pd
+from dataclasses import dataclass
 from typing import List, Optional, Union
-import scipy.stats as stats
-import statsmodels.api as sm
-import matplotlib.pyplot as plt
-from scipy.stats import shapiro
+
+## scipy.stats, statsmodels and matplotlib are imported within the functions that need them,
+## as importing them costs more than most of the computations here
 
 
 # Tukey's method
@@ -18,20 +19,30 @@ def tukeys_method(arr: np.ndarray, k: float):
     return filtered_arr
 
 
+def tukeys_mask(residuals: np.ndarray, k: float) -> np.ndarray:
+    """Tukey's method on every column of residuals at once: mask of the values within the fences"""
+    q1, q3 = np.quantile(residuals, [0.25, 0.75], axis=0)
+    iqr = q3 - q1
+    return (residuals >= q1 - k * iqr) & (residuals <= q3 + k * iqr)
+
+
 def make_qqplot(y_tilde, k=1.5, MAKEPLOT=True):
+    import scipy.stats as stats
+    import statsmodels.api as sm
+
     if k is not None:
         y_tilde = tukeys_method(y_tilde, k)
 
     # Fit a line to the QQ plot data
-    osm, osr = (
-        sm.ProbPlot(y_tilde).sample_quantiles,
-        sm.ProbPlot(y_tilde).theoretical_quantiles,
-    )
+    probplot = sm.ProbPlot(y_tilde)
+    osm, osr = probplot.sample_quantiles, probplot.theoretical_quantiles
 
     # Perform linear regression on the QQ plot data
     slope, intercept, r_value, _, _ = stats.linregress(osr, osm)
 
     if MAKEPLOT:
+        import matplotlib.pyplot as plt
+
         # Generate the QQ plot data
         sm.qqplot(y_tilde)
 
@@ -47,6 +58,7 @@ def make_qqplot(y_tilde, k=1.5, MAKEPLOT=True):
 
 
 def test_normality(y_tilde: np.ndarray, k: Optional[float] = None):
+    from scipy.stats import shapiro
 
     if k is not None:
         y_tilde = tukeys_method(y_tilde, k)
@@ -58,3 +70,107 @@ def test_normality(y_tilde: np.ndarray, k: Optional[float] = None):
         print("The data IS normally distributed. p-value:", pval)
 
     return pval
+
+
+@dataclass
+class ResidualDiagnostics:
+    """Per-column diagnostics of a residual matrix (see `residual_diagnostics`)"""
+
+    residuals: np.ndarray
+    mask: np.ndarray  # values kept by Tukey's method (all True if no k was given)
+    slope: np.ndarray  # QQ-plot fitted line, sample vs normal theoretical quantiles
+    intercept: np.ndarray
+    r_value: np.ndarray
+    shapiro_pvalue: np.ndarray
+    labels: Optional[List[str]] = None
+
+    def to_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "n_kept": self.mask.sum(axis=0),
+                "slope": self.slope,
+                "intercept": self.intercept,
+                "R2": self.r_value**2,
+                "shapiro_pvalue": self.shapiro_pvalue,
+                "normal": self.shapiro_pvalue >= 0.05,
+            },
+            index=self.labels,
+        )
+
+    def plot_qq(self, column: Union[int, str] = 0, ax=None):
+        """QQ plot of one column, with its fitted line - matplotlib is only needed (and imported) here"""
+        import matplotlib.pyplot as plt
+        import scipy.stats as stats
+
+        j = self.labels.index(column) if isinstance(column, str) else column
+        y = np.sort(self.residuals[self.mask[:, j], j])
+        osr = stats.norm.ppf(np.arange(1, len(y) + 1) / (len(y) + 1))
+        if ax is None:
+            ax = plt.subplots()[1]
+        ax.plot(osr, y, "o", markerfacecolor="none")
+        ax.plot(
+            osr,
+            self.intercept[j] + self.slope[j] * osr,
+            "r",
+            label=f"Fitted line: \ny={self.intercept[j]:.2f}\nm={self.slope[j]:.2f}\nR²={self.r_value[j]**2:.2f}",
+        )
+        ax.set_xlabel("Theoretical Quantiles")
+        ax.set_ylabel("Sample Quantiles")
+        if self.labels is not None:
+            ax.set_title(str(self.labels[j]))
+        ax.legend()
+        return ax
+
+
+def residual_diagnostics(
+    residuals: np.ndarray,
+    k: Optional[float] = 1.5,
+    labels: Optional[List[str]] = None,
+) -> ResidualDiagnostics:
+    """Tukey filtering, QQ-plot line fit and Shapiro-Wilk test of all columns of a
+    (n_samples x n_columns) residual matrix at once - eg one column per response and CV fold.
+    Same results as `make_qqplot` / `test_normality` column by column, without any plotting.
+    """
+    import scipy.stats as stats
+
+    residuals = np.asarray(residuals, dtype=float)
+    if residuals.ndim == 1:
+        residuals = residuals[:, None]
+    mask = (
+        tukeys_mask(residuals, k) if k is not None else np.ones(residuals.shape, bool)
+    )
+    n_kept = mask.sum(axis=0)
+
+    ## sorted kept values of each column (filtered ones become NaN, sorted last)
+    sample_q = np.sort(np.where(mask, residuals, np.nan), axis=0)
+    ranks = np.arange(1, len(residuals) + 1)[:, None]
+    valid = ranks <= n_kept
+    ## same plotting positions as statsmodels' ProbPlot: i / (n + 1)
+    theoretical_q = np.where(valid, stats.norm.ppf(ranks / (n_kept + 1)), np.nan)
+
+    ## least squares fit of sample vs theoretical quantiles, per column
+    x_mean = np.nanmean(theoretical_q, axis=0)
+    y_mean = np.nanmean(sample_q, axis=0)
+    dx = np.where(valid, theoretical_q - x_mean, 0.0)
+    dy = np.where(valid, sample_q - y_mean, 0.0)
+    sxx, syy, sxy = (dx**2).sum(axis=0), (dy**2).sum(axis=0), (dx * dy).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = sxy / sxx
+        r_value = sxy / np.sqrt(sxx * syy)
+    intercept = y_mean - slope * x_mean
+
+    shapiro_pvalue = np.array(
+        [
+            stats.shapiro(residuals[mask[:, j], j]).pvalue if n_kept[j] >= 3 else np.nan
+            for j in range(residuals.shape[1])
+        ]
+    )
+    return ResidualDiagnostics(
+        residuals=residuals,
+        mask=mask,
+        slope=slope,
+        intercept=intercept,
+        r_value=r_value,
+        shapiro_pvalue=shapiro_pvalue,
+        labels=labels,
+    )
@@ -0,0 +1,503 @@
+### In-process Gaussian process surrogate (NumPy / SciPy) - trained once on the same training file
+### as Dakota's surrogate model (`import_build_points_file`), then queried without any Dakota study.
+### scipy is only imported by the methods using it, as by funs_gp_evaluation.
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from pathlib import Path
+import os
+import numpy as np
+import pandas as pd
+from mmux_utils.funs_data_processing import load_data
+from mmux_utils.funs_gp_evaluation import ResidualDiagnostics, residual_diagnostics
+
+## same metrics as Dakota's surrogate cross_validation
+CROSS_VALIDATION_METRICS = ["root_mean_squared", "sum_abs", "mean_abs", "max_abs", "rsquared"]
+
+
+def _sq_distances(X1: np.ndarray, X2: np.ndarray, lengthscales: np.ndarray) -> np.ndarray:
+    """Squared (lengthscale-scaled) euclidean distances between the rows of X1 and X2"""
+    A, B = X1 / lengthscales, X2 / lengthscales
+    D = (A**2).sum(axis=1)[:, None] + (B**2).sum(axis=1)[None, :] - 2 * A @ B.T
+    return np.maximum(D, 0.0)
+
+
+def _cholesky(K: np.ndarray) -> np.ndarray:
+    """Lower Cholesky factor of K, adding jitter to the diagonal if needed"""
+    jitter = 0.0
+    for _ in range(6):
+        try:
+            return np.linalg.cholesky(K + jitter * np.eye(len(K)))
+        except np.linalg.LinAlgError:
+            jitter = max(10 * jitter, 1e-10 * np.mean(np.diag(K)))
+    raise np.linalg.LinAlgError("Kernel matrix is not positive definite, even with jitter")
+
+
+def make_folds(n_samples: int, n_folds: Optional[int] = None, seed: Optional[int] = 0):
+    """Indices of the held-out points of each fold - one point per fold (leave-one-out) if
+    n_folds is None, otherwise n_folds random folds of (nearly) equal sizes"""
+    if n_folds is None or n_folds >= n_samples:
+        return [np.array([i]) for i in range(n_samples)]
+    permutation = np.random.default_rng(seed).permutation(n_samples)
+    return [np.sort(fold) for fold in np.array_split(permutation, n_folds)]
+
+
+def cross_validation_metrics(y: np.ndarray, residuals: np.ndarray) -> Dict[str, float]:
+    """CROSS_VALIDATION_METRICS of held-out residuals (y - prediction)"""
+    y, residuals = np.asarray(y, dtype=float), np.asarray(residuals, dtype=float)
+    abs_residuals = np.abs(residuals)
+    return {
+        "root_mean_squared": float(np.sqrt(np.mean(residuals**2))),
+        "sum_abs": float(abs_residuals.sum()),
+        "mean_abs": float(abs_residuals.mean()),
+        "max_abs": float(abs_residuals.max()),
+        "rsquared": float(1 - np.sum(residuals**2) / np.sum((y - y.mean()) ** 2)),
+    }
+
+
+class GaussianProcess:
+    """Single-output GP with an ARD squared-exponential kernel plus a (learnt) noise / nugget term:
+
+        k(x, x') = variance * exp(-0.5 * sum_j ((x_j - x'_j) / lengthscale_j)^2) + noise * [x == x']
+
+    Inputs are standardized and outputs normalized on fit; the hyperparameters maximize the log
+    marginal likelihood (L-BFGS-B with analytic gradients, from a few starting points). The
+    Cholesky factor of the training kernel matrix is cached, so that predictions only cost
+    O(n) (mean) / O(n^2) (variance) per query point.
+
+    Training points can be appended with `add_points` (eg in an adaptive sampling loop run from
+    Python): the Cholesky factor is then extended by a block update in O(n^2) per point instead
+    of being recomputed in O(n^3), and hyperparameters (and normalization) are only refit after
+    refit_every new points.
+
+    Args:
+        nugget (float, optional): Lower bound of the noise variance (relative to normalized outputs).
+        n_restarts (int, optional): Random starting points of the optimizer, besides the default one.
+        seed (int, optional): Seed of those random starting points.
+        refit_every (int, optional): Refit the hyperparameters once this many points have been
+            added since the last fit (never if None).
+    """
+
+    def __init__(
+        self,
+        nugget: float = 1e-8,
+        n_restarts: int = 2,
+        seed: Optional[int] = 0,
+        refit_every: Optional[int] = None,
+    ):
+        self.nugget = nugget
+        self.n_restarts = n_restarts
+        self.seed = seed
+        self.refit_every = refit_every
+        self.lengthscales: Optional[np.ndarray] = None  # in standardized input units
+        self.variance = 1.0  # in normalized output units
+        self.noise = nugget
+        self.n_added = 0  # points added since the last fit
+        self._n = 0
+
+    ## (de)normalization
+    def _set_normalization(self, X: np.ndarray, y: np.ndarray):
+        self.x_mean, self.x_std = X.mean(axis=0), X.std(axis=0)
+        self.x_std[self.x_std == 0] = 1.0
+        self.y_mean, self.y_std = float(y.mean()), float(y.std()) or 1.0
+
+    def _normalize_X(self, X: np.ndarray) -> np.ndarray:
+        return (np.asarray(X, dtype=float) - self.x_mean) / self.x_std
+
+    ## hyperparameters, as log(lengthscales), log(variance), log(noise)
+    def _get_theta(self) -> np.ndarray:
+        return np.log(np.concatenate([self.lengthscales, [self.variance, self.noise]]))
+
+    def _set_theta(self, theta: np.ndarray):
+        self.lengthscales = np.exp(theta[:-2])
+        self.variance, self.noise = float(np.exp(theta[-2])), float(np.exp(theta[-1]))
+
+    def _bounds(self, n_dims: int) -> List[Tuple[float, float]]:
+        return [(np.log(1e-3), np.log(1e3))] * n_dims + [
+            (np.log(1e-4), np.log(1e4)),
+            (np.log(self.nugget), np.log(1.0)),
+        ]
+
+    def _neg_log_marginal_likelihood(
+        self, theta: np.ndarray, X: np.ndarray, y: np.ndarray
+    ) -> Tuple[float, np.ndarray]:
+        from scipy.linalg import cho_solve
+
+        n, n_dims = X.shape
+        lengthscales, variance, noise = np.exp(theta[:-2]), np.exp(theta[-2]), np.exp(theta[-1])
+        K_se = variance * np.exp(-0.5 * _sq_distances(X, X, lengthscales))
+        try:
+            L = np.linalg.cholesky(K_se + noise * np.eye(n))
+        except np.linalg.LinAlgError:
+            return 1e25, np.zeros_like(theta)
+        alpha = cho_solve((L, True), y)
+        nll = 0.5 * y @ alpha + np.log(np.diag(L)).sum() + 0.5 * n * np.log(2 * np.pi)
+
+        ## d nll / d theta = -0.5 tr((alpha alpha^T - K^-1) dK/dtheta)
+        W = np.outer(alpha, alpha) - cho_solve((L, True), np.eye(n))
+        WK = W * K_se
+        grad = np.empty_like(theta)
+        for j in range(n_dims):
+            d = X[:, j : j + 1] - X[:, j : j + 1].T
+            grad[j] = -0.5 * np.sum(WK * d**2) / lengthscales[j] ** 2
+        grad[-2] = -0.5 * np.sum(WK)
+        grad[-1] = -0.5 * noise * np.trace(W)
+        return nll, grad
+
+    def _optimize(self, X: np.ndarray, y: np.ndarray):
+        from scipy.optimize import minimize
+
+        n_dims = X.shape[1]
+        bounds = self._bounds(n_dims)
+        starts = [np.concatenate([np.zeros(n_dims), [0.0, np.log(max(1e-4, self.nugget))]])]
+        rng = np.random.default_rng(self.seed)
+        low, high = np.array(bounds).T
+        for _ in range(self.n_restarts):
+            start = rng.uniform(low, high)
+            start[:n_dims] = rng.uniform(np.log(0.1), np.log(10.0), n_dims)
+            starts.append(start)
+        best = None
+        for start in starts:
+            result = minimize(
+                self._neg_log_marginal_likelihood,
+                np.clip(start, low, high),
+                args=(X, y),
+                jac=True,
+                method="L-BFGS-B",
+                bounds=bounds,
+            )
+            if best is None or result.fun < best.fun:
+                best = result
+        self._set_theta(best.x)
+
+    ## training data (normalized) and Cholesky factor live in buffers with spare capacity,
+    # so that adding points does not reallocate them every time
+    @property
+    def _X(self) -> np.ndarray:
+        return self._X_buffer[: self._n]
+
+    @property
+    def _y(self) -> np.ndarray:
+        return self._y_buffer[: self._n]
+
+    @property
+    def _L(self) -> np.ndarray:
+        return self._L_buffer[: self._n, : self._n]
+
+    def _reserve(self, n: int):
+        """Make room for n training points, keeping the current ones"""
+        if self._n and n <= len(self._X_buffer):
+            return
+        capacity = max(n, self._n + self._n // 2)  # the factor takes capacity^2 floats
+        X_buffer = np.empty((capacity, self.x_mean.shape[0]))
+        y_buffer = np.empty(capacity)
+        L_buffer = np.zeros((capacity, capacity))
+        if self._n:
+            X_buffer[: self._n], y_buffer[: self._n] = self._X, self._y
+            L_buffer[: self._n, : self._n] = self._L
+        self._X_buffer, self._y_buffer, self._L_buffer = X_buffer, y_buffer, L_buffer
+
+    def _set_training_data(self, X: np.ndarray, y: np.ndarray, L: Optional[np.ndarray] = None):
+        """Set the (normalized) training data, and factorize unless L is given"""
+        from scipy.linalg import cho_solve
+
+        self._n = 0
+        self._reserve(len(X))
+        self._n = len(X)
+        self._X_buffer[: self._n], self._y_buffer[: self._n] = X, y
+        if L is None:
+            K = self._kernel(self._X, self._X) + self.noise * np.eye(self._n)
+            L = _cholesky(K)
+        self._L_buffer[: self._n, : self._n] = L
+        self._alpha = cho_solve((self._L, True), self._y, check_finite=False)
+
+    def _kernel(self, X1: np.ndarray, X2: np.ndarray) -> np.ndarray:
+        return self.variance * np.exp(-0.5 * _sq_distances(X1, X2, self.lengthscales))
+
+    def fit(self, X: np.ndarray, y: np.ndarray, optimize: bool = True) -> "GaussianProcess":
+        """Train on X (n_samples x n_variables) and y (n_samples); if not optimize, the current
+        hyperparameters are kept (eg when loaded, or set by hand)"""
+        X, y = np.asarray(X, dtype=float), np.asarray(y, dtype=float).ravel()
+        self._set_normalization(X, y)
+        X_normalized = self._normalize_X(X)
+        y_normalized = (y - self.y_mean) / self.y_std
+        if self.lengthscales is None:
+            self.lengthscales = np.ones(X.shape[1])
+        if optimize:
+            self._optimize(X_normalized, y_normalized)
+        self._set_training_data(X_normalized, y_normalized)
+        self.n_added = 0
+        return self
+
+    @property
+    def X_train(self) -> np.ndarray:
+        return self._X * self.x_std + self.x_mean
+
+    @property
+    def y_train(self) -> np.ndarray:
+        return self._y * self.y_std + self.y_mean
+
+    def add_points(
+        self, X: np.ndarray, y: np.ndarray, refit: Optional[bool] = None
+    ) -> "GaussianProcess":
+        """Append training points. The Cholesky factor is extended with a block update -
+        O(n^2 k) for k new points - unless a refit is due (refit_every points added since the
+        last fit, or refit=True), in which case everything is refit on all the points."""
+        from scipy.linalg import cho_solve, solve_triangular
+
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        y = np.asarray(y, dtype=float).ravel()
+        self.n_added += len(X)
+        if refit is None:
+            refit = self.refit_every is not None and self.n_added >= self.refit_every
+        if refit:
+            return self.fit(
+                np.vstack([self.X_train, X]), np.concatenate([self.y_train, y])
+            )
+
+        X_new = self._normalize_X(X)
+        y_new = (y - self.y_mean) / self.y_std
+        ## [[K11, K12], [K21, K22]] = [[L11, 0], [L21, L22]] [[L11, 0], [L21, L22]]^T
+        K12 = self._kernel(self._X, X_new)
+        K22 = self._kernel(X_new, X_new) + self.noise * np.eye(len(X_new))
+        L21 = solve_triangular(self._L, K12, lower=True, check_finite=False).T
+        L22 = _cholesky(K22 - L21 @ L21.T)
+
+        n, k = self._n, len(X_new)
+        self._reserve(n + k)
+        self._X_buffer[n : n + k], self._y_buffer[n : n + k] = X_new, y_new
+        self._L_buffer[n : n + k, :n] = L21
+        self._L_buffer[n : n + k, n : n + k] = L22
+        self._n = n + k
+        self._alpha = cho_solve((self._L, True), self._y, check_finite=False)
+        return self
+
+    @property
+    def n_samples(self) -> int:
+        return self._n
+
+    def predict(
+        self, X: np.ndarray, return_var: bool = True, chunk_size: int = 4096
+    ) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        """Posterior mean (and variance, of the latent function) at the rows of X, computed
+        chunk_size query points at a time - memory stays O(n_samples x chunk_size)"""
+        from scipy.linalg import solve_triangular
+
+        X = self._normalize_X(np.atleast_2d(X))
+        mean, var = np.empty(len(X)), np.empty(len(X))
+        for start in range(0, len(X), chunk_size):
+            K_star = self._kernel(self._X, X[start : start + chunk_size])
+            mean[start : start + chunk_size] = K_star.T @ self._alpha
+            if return_var:
+                V = solve_triangular(self._L, K_star, lower=True, check_finite=False)
+                var[start : start + chunk_size] = self.variance - (V**2).sum(axis=0)
+        mean = self.y_mean + self.y_std * mean
+        if not return_var:
+            return mean
+        return mean, np.maximum(var, 0.0) * self.y_std**2
+
+    def cross_validation_residuals(
+        self, n_folds: Optional[int] = None, seed: Optional[int] = 0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Held-out residuals (y - prediction without the fold) and their predictive variances,
+        for leave-one-out (n_folds=None) or k-fold cross-validation (see `make_folds`).
+
+        Computed in closed form from the cached factorization, with the current hyperparameters
+        and normalization: for a fold I, the residuals are [K^-1]_II^-1 alpha_I and their
+        covariance [K^-1]_II^-1 - for leave-one-out, alpha_i / [K^-1]_ii and 1 / [K^-1]_ii.
+        One O(n^3) inversion in total, instead of one refit per fold."""
+        from scipy.linalg import cho_solve
+
+        K_inv = cho_solve((self._L, True), np.eye(self._n), check_finite=False)
+        folds = make_folds(self._n, n_folds, seed)
+        if len(folds) == self._n:
+            variances = 1 / np.diag(K_inv)
+            residuals = self._alpha * variances
+        else:
+            residuals, variances = np.empty(self._n), np.empty(self._n)
+            for fold in folds:
+                covariance = np.linalg.inv(K_inv[np.ix_(fold, fold)])
+                residuals[fold] = covariance @ self._alpha[fold]
+                variances[fold] = np.diag(covariance)
+        return residuals * self.y_std, variances * self.y_std**2
+
+    def cross_validate(
+        self, n_folds: Optional[int] = None, seed: Optional[int] = 0
+    ) -> Dict[str, float]:
+        """CROSS_VALIDATION_METRICS of the leave-one-out / k-fold residuals"""
+        residuals, _ = self.cross_validation_residuals(n_folds, seed)
+        return cross_validation_metrics(self.y_train, residuals)
+
+    def log_marginal_likelihood(self) -> float:
+        return -self._neg_log_marginal_likelihood(self._get_theta(), self._X, self._y)[0]
+
+    def _get_state(self, prefix: str = "") -> Dict[str, np.ndarray]:
+        state = {
+            "X": self._X,
+            "y": self._y,
+            "L": self._L,
+            "theta": self._get_theta(),
+            "x_mean": self.x_mean,
+            "x_std": self.x_std,
+            "y_normalization": np.array([self.y_mean, self.y_std]),
+            "settings": np.array(
+                [self.nugget, self.n_restarts, self.refit_every or 0, self.n_added]
+            ),
+        }
+        return {prefix + k: v for k, v in state.items()}
+
+    @classmethod
+    def _from_state(cls, state, prefix: str = "") -> "GaussianProcess":
+        nugget, n_restarts, refit_every, n_added = state[prefix + "settings"]
+        gp = cls(
+            nugget=float(nugget),
+            n_restarts=int(n_restarts),
+            refit_every=int(refit_every) or None,
+        )
+        gp.n_added = int(n_added)
+        gp._set_theta(state[prefix + "theta"])
+        gp.x_mean, gp.x_std = state[prefix + "x_mean"], state[prefix + "x_std"]
+        gp.y_mean, gp.y_std = (float(v) for v in state[prefix + "y_normalization"])
+        gp._set_training_data(state[prefix + "X"], state[prefix + "y"], L=state[prefix + "L"])
+        return gp
+
+
+class GPSurrogate:
+    """One GaussianProcess per response - the in-process equivalent of a Dakota
+    `surrogate global gaussian_process` model, trained once and queried any number of times.
+
+    Args:
+        variables: Names of the input columns.
+        responses: Names of the output columns.
+        **gp_kwargs: Passed to each GaussianProcess (nugget, n_restarts, seed, refit_every).
+    """
+
+    def __init__(self, variables: Sequence[str], responses: Sequence[str], **gp_kwargs):
+        self.variables = list(variables)
+        self.responses = list(responses)
+        self.gps = {r: GaussianProcess(**gp_kwargs) for r in self.responses}
+
+    def fit(self, X: np.ndarray, Y: np.ndarray, optimize: bool = True) -> "GPSurrogate":
+        Y = np.asarray(Y, dtype=float).reshape(len(X), len(self.responses))
+        for j, r in enumerate(self.responses):
+            self.gps[r].fit(X, Y[:, j], optimize=optimize)
+        return self
+
+    def add_points(
+        self, X: np.ndarray, Y: np.ndarray, refit: Optional[bool] = None
+    ) -> "GPSurrogate":
+        """Append training points to every response's GP (see `GaussianProcess.add_points`)"""
+        X = np.atleast_2d(np.asarray(X, dtype=float))
+        Y = np.asarray(Y, dtype=float).reshape(len(X), len(self.responses))
+        for j, r in enumerate(self.responses):
+            self.gps[r].add_points(X, Y[:, j], refit=refit)
+        return self
+
+    @classmethod
+    def from_training_file(
+        cls,
+        files: Union[Path, List[Path]],
+        responses: Optional[Sequence[str]] = None,
+        n_responses: int = 1,
+        columns_to_remove: Sequence[str] = ("interface",),
+        **gp_kwargs,
+    ) -> "GPSurrogate":
+        """Train on a training file as given to Dakota's `import_build_points_file` (eg made by
+        `process_input_file`): %eval_id and columns_to_remove are dropped, responses default to
+        the last n_responses columns and variables are the other columns."""
+        df = load_data(files)
+        df = df.drop(columns=[c for c in [r"%eval_id", *columns_to_remove] if c in df])
+        responses = list(responses) if responses is not None else list(df.columns[-n_responses:])
+        variables = [c for c in df.columns if c not in responses]
+        surrogate = cls(variables, responses, **gp_kwargs)
+        return surrogate.fit(df[variables].to_numpy(float), df[responses].to_numpy(float))
+
+    def _as_array(self, X: Union[np.ndarray, pd.DataFrame]) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            return X[self.variables].to_numpy(dtype=float)
+        return np.asarray(X, dtype=float)
+
+    def predict(
+        self,
+        X: Union[np.ndarray, pd.DataFrame],
+        return_var: bool = True,
+        chunk_size: int = 4096,
+    ) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        """Mean (and variance) predictions, as (n_points x n_responses) arrays"""
+        X = self._as_array(X)
+        predictions = [
+            self.gps[r].predict(X, return_var=return_var, chunk_size=chunk_size)
+            for r in self.responses
+        ]
+        if not return_var:
+            return np.column_stack(predictions)
+        return (
+            np.column_stack([p[0] for p in predictions]),
+            np.column_stack([p[1] for p in predictions]),
+        )
+
+    def cross_validation_residuals(
+        self, n_folds: Optional[int] = None, seed: Optional[int] = 0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Held-out residuals and variances, as (n_samples x n_responses) arrays
+        (see `GaussianProcess.cross_validation_residuals`)"""
+        results = [self.gps[r].cross_validation_residuals(n_folds, seed) for r in self.responses]
+        return (
+            np.column_stack([residuals for residuals, _ in results]),
+            np.column_stack([variances for _, variances in results]),
+        )
+
+    def cross_validate(
+        self, n_folds: Optional[int] = None, seed: Optional[int] = 0
+    ) -> pd.DataFrame:
+        """CROSS_VALIDATION_METRICS per response (rows) - leave-one-out if n_folds is None"""
+        return pd.DataFrame(
+            [self.gps[r].cross_validate(n_folds, seed) for r in self.responses],
+            index=self.responses,
+            columns=CROSS_VALIDATION_METRICS,
+        )
+
+    def cross_validation_diagnostics(
+        self,
+        n_folds: Optional[int] = None,
+        seed: Optional[int] = 0,
+        standardize: bool = True,
+        k: Optional[float] = 1.5,
+    ) -> ResidualDiagnostics:
+        """`residual_diagnostics` of the held-out residuals, one column per response -
+        standardized by their predictive standard deviations (so ~N(0, 1) if the GP is
+        well calibrated) unless not standardize"""
+        residuals, variances = self.cross_validation_residuals(n_folds, seed)
+        if standardize:
+            residuals = residuals / np.sqrt(variances)
+        return residual_diagnostics(residuals, k=k, labels=self.responses)
+
+    def predict_dataframe(
+        self, X: Union[np.ndarray, pd.DataFrame], chunk_size: int = 4096
+    ) -> pd.DataFrame:
+        """Inputs, predictions and their variances ("<response>_variance") as a DataFrame"""
+        X = self._as_array(X)
+        mean, var = self.predict(X, chunk_size=chunk_size)
+        df = pd.DataFrame(X, columns=self.variables)
+        df[self.responses] = mean
+        df[[f"{r}_variance" for r in self.responses]] = var
+        return df
+
+    def save(self, path: Union[str, Path]):
+        """Save to a .npz file (hyperparameters and factorizations - loading does not refit)"""
+        path = Path(path)
+        state = {
+            "variables": np.array(self.variables),
+            "responses": np.array(self.responses),
+        }
+        for j, r in enumerate(self.responses):
+            state.update(self.gps[r]._get_state(prefix=f"{j}_"))
+        tmp_path = path.with_name(path.name + ".tmp.npz")
+        np.savez(tmp_path, **state)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "GPSurrogate":
+        with np.load(path) as state:
+            surrogate = cls(state["variables"].tolist(), state["responses"].tolist())
+            for j, r in enumerate(surrogate.responses):
+                surrogate.gps[r] = GaussianProcess._from_state(state, prefix=f"{j}_")
+        return surrogate
@@ -0,0 +1,211 @@
+### Hypervolume indicator - to track the convergence of MOGA and surrogate-based optimization runs
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, Sequence, Tuple, Union
+from pathlib import Path
+import numpy as np
+from mmux_utils.funs_pareto import (
+    ParetoArchive,
+    Sense,
+    _as_minimization,
+    _dominated_by,
+    non_dominated_mask,
+)
+
+
+def _prepare_front(
+    F: np.ndarray, ref_point: Sequence[float], sense: Optional[Sense]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Non-dominated points strictly better than the reference point, all as minimization"""
+    F = _as_minimization(F, sense)
+    ref = _as_minimization(np.asarray(ref_point, dtype=float)[None, :], sense)[0]
+    assert len(ref) == F.shape[1], "The reference point must have one value per objective"
+    F = F[np.all(F < ref, axis=1)]
+    if len(F):
+        F = F[non_dominated_mask(F)]
+    return F, ref
+
+
+def _hypervolume_2d(F: np.ndarray, ref: np.ndarray) -> float:
+    ## sorted by increasing f0 (and thus decreasing f1), the dominated region is a staircase
+    F = F[np.lexsort((F[:, 1], F[:, 0]))]
+    next_f0 = np.r_[F[1:, 0], ref[0]]
+    return float(np.sum((next_f0 - F[:, 0]) * (ref[1] - F[:, 1])))
+
+
+def _hypervolume_3d(F: np.ndarray, ref: np.ndarray) -> float:
+    """O(n log n) sweep along the third objective (Beume et al.), keeping the 2D staircase
+    of the points seen so far and its dominated area up to date on each insertion."""
+    F = F[np.argsort(F[:, 2], kind="stable")]
+    xs: List[float] = []
+    neg_ys: List[float] = []  # -y, increasing along the staircase
+    r0, r1 = float(ref[0]), float(ref[1])
+
+    def area_of(lo: int, hi: int) -> float:
+        ## area contributed by staircase points lo..hi-1 (each up to the next point's x)
+        area = 0.0
+        for i in range(lo, hi):
+            next_x = xs[i + 1] if i + 1 < len(xs) else r0
+            area += (next_x - xs[i]) * (r1 + neg_ys[i])
+        return area
+
+    area, volume, prev_z = 0.0, 0.0, None
+    for x, y, z in F.tolist():
+        if prev_z is not None:
+            volume += area * (z - prev_z)
+        prev_z = z
+        idx = bisect_right(xs, x) - 1
+        if idx >= 0 and -neg_ys[idx] <= y:
+            continue  # dominated in the (x, y) projection, the area does not change
+        pos = bisect_left(xs, x)
+        end = bisect_right(neg_ys, -y, lo=pos)
+        lo = max(pos - 1, 0)
+        old_area = area_of(lo, end)
+        xs[pos:end] = [x]
+        neg_ys[pos:end] = [-y]
+        area += area_of(lo, pos + 1) - old_area
+    if prev_z is not None:
+        volume += area * (ref[2] - prev_z)
+    return float(volume)
+
+
+def hypervolume_monte_carlo(
+    F: np.ndarray,
+    ref_point: Sequence[float],
+    sense: Optional[Sense] = None,
+    n_samples: int = 100_000,
+    seed: Optional[int] = None,
+    chunk_size: int = 1024,
+) -> Tuple[float, float]:
+    """Monte Carlo estimate of the hypervolume, for any number of objectives.
+    Samples are drawn (in chunks) in the box between the ideal point and ref_point.
+
+    Returns:
+        The estimate and its standard error.
+    """
+    F, ref = _prepare_front(F, ref_point, sense)
+    if len(F) == 0:
+        return 0.0, 0.0
+    ideal = F.min(axis=0)
+    box_volume = float(np.prod(ref - ideal))
+    rng = np.random.default_rng(seed)
+    n_dominated = 0
+    for start in range(0, n_samples, chunk_size):
+        n = min(chunk_size, n_samples - start)
+        samples = ideal + rng.random((n, len(ref))) * (ref - ideal)
+        n_dominated += int(np.sum(_dominated_by(F, samples, chunk_size)))
+    p = n_dominated / n_samples
+    return box_volume * p, float(box_volume * np.sqrt(p * (1 - p) / n_samples))
+
+
+def hypervolume(
+    F: np.ndarray,
+    ref_point: Sequence[float],
+    sense: Optional[Sense] = None,
+    n_samples: int = 100_000,
+    seed: Optional[int] = None,
+) -> float:
+    """Hypervolume dominated by the points F (n_points x n_objectives) up to ref_point.
+
+    Exact for up to 3 objectives (O(n log n) sweeps), a Monte Carlo estimate
+    (see `hypervolume_monte_carlo`) with n_samples for more objectives.
+    Points not strictly better than ref_point in all objectives do not contribute.
+    """
+    n_objectives = _as_minimization(F, sense).shape[1]
+    if n_objectives > 3:
+        return hypervolume_monte_carlo(F, ref_point, sense, n_samples, seed)[0]
+    F, ref = _prepare_front(F, ref_point, sense)
+    if len(F) == 0:
+        return 0.0
+    if n_objectives == 1:
+        return float(ref[0] - F[:, 0].min())
+    elif n_objectives == 2:
+        return _hypervolume_2d(F, ref)
+    else:
+        return _hypervolume_3d(F, ref)
+
+
+class HypervolumeTracker:
+    """Hypervolume of the cumulative front, updated incrementally as new points come in
+    (e.g. once per surrogate-based optimization iteration).
+
+    Args:
+        ref_point: Reference point (in the original sense of the objectives).
+        sense (optional): 'min' or 'max', for all objectives or one per objective.
+        n_samples / seed (optional): For the Monte Carlo estimate (> 3 objectives).
+    """
+
+    def __init__(
+        self,
+        ref_point: Sequence[float],
+        sense: Optional[Sense] = None,
+        n_samples: int = 100_000,
+        seed: Optional[int] = 0,
+    ):
+        self.ref_point = list(ref_point)
+        self.sense = sense
+        self.n_samples = n_samples
+        self.seed = seed
+        self.archive = ParetoArchive(sense=sense)
+        self.history: List[float] = []
+        self.n_files_read = 0  # iteration files read by track_finaldata_hypervolume
+
+    @property
+    def n_iterations(self) -> int:
+        return len(self.history)
+
+    def update(self, F: np.ndarray) -> float:
+        """Add the points of a new iteration, and return the hypervolume of the front so far"""
+        accepted = self.archive.update(F)
+        if len(self.archive) == 0:
+            hv = 0.0  # no point yet (its front would not even have a column per objective)
+        elif accepted.any() or not self.history:
+            hv = hypervolume(
+                self.archive.front, self.ref_point, self.sense, self.n_samples, self.seed
+            )
+        else:
+            hv = self.history[-1]  # the front did not change
+        self.history.append(hv)
+        return hv
+
+    def has_converged(self, rtol: float = 1e-3, window: int = 3) -> bool:
+        """Whether the hypervolume improved by less than rtol (relative) over the last window
+        iterations - never while it is still 0 (no point dominates ref_point yet)"""
+        if len(self.history) <= window:
+            return False
+        previous, current = self.history[-window - 1], self.history[-1]
+        if current <= 0.0:
+            return False
+        return current - previous <= rtol * max(abs(current), np.finfo(float).tiny)
+
+
+def track_finaldata_hypervolume(
+    opt_dir: Union[str, Path],
+    n_variables: int,
+    ref_point: Optional[Sequence[float]] = None,
+    sense: Optional[Sense] = None,
+    tracker: Optional[HypervolumeTracker] = None,
+    truth: bool = True,
+    finished: bool = False,
+) -> HypervolumeTracker:
+    """Feed the `finaldata{i}.dat` (or `finaldatatruth{i}.dat`, if truth) files of a
+    surrogate_based_global run into a HypervolumeTracker.
+
+    Only files not read yet (tracked by tracker.n_files_read) are read, so this can be called
+    repeatedly on a running study. As Dakota may still be writing the last file, it is only
+    read once the next iteration's file exists, or if the run has finished. Each file has no
+    header; the first n_variables columns are the variables and the rest the responses.
+    """
+    opt_dir = Path(opt_dir)
+    if tracker is None:
+        assert ref_point is not None, "Either a tracker or a ref_point must be provided"
+        tracker = HypervolumeTracker(ref_point, sense=sense)
+    file_name = "finaldatatruth{}.dat" if truth else "finaldata{}.dat"
+    while True:
+        path = opt_dir / file_name.format(tracker.n_files_read + 1)
+        next_path = opt_dir / file_name.format(tracker.n_files_read + 2)
+        if not path.exists() or not (finished or next_path.exists()):
+            break
+        data = np.loadtxt(path, ndmin=2)
+        tracker.update(data[:, n_variables:])
+        tracker.n_files_read += 1
+    return tracker
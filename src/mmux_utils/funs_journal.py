@@ -0,0 +1,212 @@
+### Crash-safe journal of completed evaluations - to resume run_dakota studies after a crash
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Union
+from pathlib import Path
+import json
+import os
+import time
+from mmux_utils.funs_evaluate import accepts_on_result, get_input_vector, run_dakota
+
+
+class EvaluationJournal:
+    """Append-only JSONL journal of completed evaluations, stored in the run directory.
+
+    Each record is written (and flushed) as soon as it completes; fsync is batched - every
+    fsync_every records or fsync_interval seconds, and at the end of every batch - so that
+    journaling costs nothing next to the simulations. On opening, the records of a previous
+    (crashed) run are loaded, skipping a partially written last line.
+
+    Args:
+        run_dir: Directory of the run (eg from `funs_evaluate.create_run_dir`).
+        file_name (str, optional): Name of the journal within run_dir.
+        fsync_every / fsync_interval (optional): How often the journal is forced to disk.
+    """
+
+    def __init__(
+        self,
+        run_dir: Union[str, Path],
+        file_name: str = "evaluations.jsonl",
+        fsync_every: int = 32,
+        fsync_interval: float = 5.0,
+    ):
+        self.path = Path(run_dir) / file_name
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._responses: Dict[str, dict] = {}
+        self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @staticmethod
+    def key(input_vector: Sequence[float]) -> str:
+        ## repr round-trips floats exactly, so only identical inputs match
+        return ",".join(repr(float(v)) for v in input_vector)
+
+    @staticmethod
+    def read_records(path: Union[str, Path]) -> Iterator[dict]:
+        """Records of a journal file - a partially written last line is ignored"""
+        if not Path(path).exists():
+            return
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # the run crashed while writing this record
+                yield json.loads(line)
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        valid_size = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                record = json.loads(line)
+                self._responses[self.key(record["x"])] = record["response"]
+                valid_size += len(line)
+        ## drop a partially written last record, so that new records start on their own line
+        if self.path.stat().st_size > valid_size:
+            os.truncate(self.path, valid_size)
+
+    def __len__(self) -> int:
+        return len(self._responses)
+
+    def __contains__(self, input_vector: Sequence[float]) -> bool:
+        return self.key(input_vector) in self._responses
+
+    def lookup(self, input_vector: Sequence[float]) -> Optional[dict]:
+        return self._responses.get(self.key(input_vector))
+
+    def record(self, input_vector: Sequence[float], response: dict):
+        x = [float(v) for v in input_vector]
+        self._file.write(
+            json.dumps({"x": x, "response": response, "t": time.time()}, default=float)
+            + "\n"
+        )
+        self._file.flush()
+        self._responses[self.key(x)] = response
+        self._unsynced += 1
+        if (
+            self._unsynced >= self.fsync_every
+            or time.monotonic() - self._last_sync >= self.fsync_interval
+        ):
+            self.sync()
+
+    def sync(self):
+        if self._unsynced:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JournaledEvaluator:
+    """Wraps a Dakota evaluator callback (eg a ParallelBatchEvaluator, or
+    `functools.partial(batch_evaluator_local, model)`) with an EvaluationJournal:
+    inputs already in the journal are answered from it, only the others are evaluated,
+    and their responses are journaled as they complete.
+
+    Batch evaluators of funs_evaluate report each completed evaluation through their on_result
+    argument, so every evaluation finished before a crash is journaled, even within a batch.
+    For other batch callbacks (without an on_result argument), the batch is the unit of
+    recovery: its responses are only journaled once the whole batch has returned.
+
+    Args:
+        evaluator: Batch callback (list of Dakota dicts -> list of responses) if batch_mode,
+            single-evaluation callback (Dakota dict -> response) otherwise.
+        journal: Where evaluations are recorded and looked up.
+    """
+
+    def __init__(
+        self, evaluator: Callable, journal: EvaluationJournal, batch_mode: bool = True
+    ):
+        self.evaluator = evaluator
+        self.journal = journal
+        self.batch_mode = batch_mode
+        self.n_replayed = 0
+
+    def _evaluate_batch(self, batch_input: List[dict]) -> List[dict]:
+        input_vectors = [get_input_vector(i) for i in batch_input]
+        responses = [self.journal.lookup(x) for x in input_vectors]
+        missing = [i for i, r in enumerate(responses) if r is None]
+        self.n_replayed += len(batch_input) - len(missing)
+        if missing:
+            missing_input = [batch_input[i] for i in missing]
+            if accepts_on_result(self.evaluator):
+
+                def on_result(j: int, response: dict):
+                    self.journal.record(input_vectors[missing[j]], response)
+
+                new_responses = list(self.evaluator(missing_input, on_result=on_result))
+            else:
+                new_responses = list(self.evaluator(missing_input))
+                for i, response in zip(missing, new_responses):
+                    self.journal.record(input_vectors[i], response)
+            for i, response in zip(missing, new_responses):
+                responses[i] = response
+            self.journal.sync()
+        return responses
+
+    def __call__(self, input: Union[dict, List[dict]]):
+        if self.batch_mode:
+            return self._evaluate_batch(input)
+        response = self.journal.lookup(get_input_vector(input))
+        if response is not None:
+            self.n_replayed += 1
+            return response
+        response = self.evaluator(input)
+        self.journal.record(get_input_vector(input), response)
+        self.journal.sync()
+        return response
+
+
+def run_dakota_with_journal(
+    dakota_conf_path: Path,
+    run_dir: Path,
+    evaluator: Callable,
+    batch_mode: bool = True,
+    restart_file: str = "dakota.rst",
+) -> JournaledEvaluator:
+    """Run (or resume) a Dakota study within run_dir, journaling every completed evaluation.
+
+    If a previous attempt left a Dakota restart file in run_dir, it is read back (Dakota skips
+    the evaluations it contains), and the evaluations in the journal are answered instantly -
+    so a crashed study restarts in seconds, without replaying any simulation.
+    """
+    run_dir = Path(run_dir).resolve()
+    dakota_conf_path = Path(dakota_conf_path).resolve()
+    restart_path = run_dir / restart_file
+    ## read the previous restart file under another name, as Dakota writes its own into the cwd
+    read_restart = run_dir / f"previous_{restart_file}"
+    if restart_path.exists() and restart_path.stat().st_size > 0:
+        os.replace(restart_path, read_restart)
+    if not read_restart.exists():
+        read_restart = None
+
+    cwd = os.getcwd()
+    with EvaluationJournal(run_dir) as journal:
+        journaled = JournaledEvaluator(evaluator, journal, batch_mode=batch_mode)
+        if len(journal):
+            print(f"Resuming: {len(journal)} evaluations found in {journal.path}")
+        try:
+            os.chdir(run_dir)
+            run_dakota(
+                dakota_conf_path,
+                batch_mode=batch_mode,
+                evaluator=journaled,
+                read_restart=read_restart,
+            )
+        finally:
+            os.chdir(cwd)
+    return journaled
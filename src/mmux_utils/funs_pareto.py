@@ -0,0 +1,528 @@
+### Vectorized Pareto utilities - non-dominated filtering of (large) sets of objective values
+from bisect import bisect_left, bisect_right
+from typing import List, Literal, Optional, Sequence, Tuple, Union
+from pathlib import Path
+import os
+import numpy as np
+
+Sense = Union[Literal["min", "max"], Sequence[Literal["min", "max"]]]
+
+
+def _as_minimization(F: np.ndarray, sense: Optional[Sense] = None) -> np.ndarray:
+    """Return a float copy of F (n_points x n_objectives) where all objectives are to be minimized"""
+    F = np.array(F, dtype=float, copy=True)
+    if F.ndim == 1:
+        F = F[:, None]
+    assert F.ndim == 2, f"Objectives must be a 2D array, got shape {F.shape}"
+    if sense is None:
+        return F
+    if isinstance(sense, str):
+        sense = [sense] * F.shape[1]
+    assert len(sense) == F.shape[1], "One sense ('min' / 'max') per objective must be given"
+    for j, s in enumerate(sense):
+        if s == "max":
+            F[:, j] = -F[:, j]
+        elif s != "min":
+            raise ValueError(f"Unknown sense '{s}', must be 'min' or 'max'")
+    return F
+
+
+class _Staircase:
+    """2D non-dominated set of points (a, b), sorted by increasing a (and thus decreasing b).
+
+    Allows to check in O(log n) whether a point is (weakly) dominated by the set,
+    and to insert a point removing all the ones it dominates.
+    """
+
+    def __init__(self):
+        self.a: List[float] = []
+        self.neg_b: List[float] = []  # -b, so that it is increasing as well
+
+    def __len__(self):
+        return len(self.a)
+
+    def dominates(self, a: float, b: float) -> bool:
+        ## the last point with a' <= a is the one with smallest b' among them
+        idx = bisect_right(self.a, a) - 1
+        return idx >= 0 and -self.neg_b[idx] <= b
+
+    def insert(self, a: float, b: float) -> None:
+        """Insert (a, b) - it must not be dominated by the staircase"""
+        pos = bisect_left(self.a, a)
+        ## points after pos have a' >= a; the ones with b' >= b are dominated by (a, b)
+        end = bisect_right(self.neg_b, -b, lo=pos)
+        self.a[pos:end] = [a]
+        self.neg_b[pos:end] = [-b]
+
+
+def _non_dominated_mask_2d(F: np.ndarray) -> np.ndarray:
+    """Sort-and-sweep filter for 2 objectives, O(n log n) and fully vectorized"""
+    n = len(F)
+    order = np.lexsort((F[:, 1], F[:, 0]))
+    f0, f1 = F[order, 0], F[order, 1]
+
+    ## group points with the same first objective
+    starts = np.flatnonzero(np.r_[True, f0[1:] != f0[:-1]])
+    group_sizes = np.diff(np.r_[starts, n])
+    group_min = f1[starts]  # sorted by f1 within each group
+    ## best f1 among all points with a strictly smaller f0
+    best_before = np.r_[np.inf, np.minimum.accumulate(group_min)[:-1]]
+
+    sorted_mask = (f1 == np.repeat(group_min, group_sizes)) & (
+        f1 < np.repeat(best_before, group_sizes)
+    )
+    mask = np.empty(n, dtype=bool)
+    mask[order] = sorted_mask
+    return mask
+
+
+def _non_dominated_mask_3d(F: np.ndarray) -> np.ndarray:
+    """Sort-and-sweep filter for 3 objectives (Kung et al.), O(n log n) comparisons"""
+    n = len(F)
+    order = np.lexsort((F[:, 2], F[:, 1], F[:, 0]))
+    Fs = F[order]
+    f0 = Fs[:, 0]
+    starts = np.flatnonzero(np.r_[True, f0[1:] != f0[:-1]])
+    ends = np.r_[starts[1:], n]
+
+    staircase = _Staircase()
+    sorted_mask = np.zeros(n, dtype=bool)
+    f1, f2 = Fs[:, 1].tolist(), Fs[:, 2].tolist()
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        if end - start == 1:
+            if not staircase.dominates(f1[start], f2[start]):
+                sorted_mask[start] = True
+                staircase.insert(f1[start], f2[start])
+            continue
+        ## points sharing the first objective: check against the points with a strictly
+        # smaller first objective, and among themselves (which is a 2D problem)
+        survivors = [
+            i for i in range(start, end) if not staircase.dominates(f1[i], f2[i])
+        ]
+        if not survivors:
+            continue
+        group_mask = _non_dominated_mask_2d(Fs[survivors, 1:])
+        for i in np.asarray(survivors)[group_mask].tolist():
+            sorted_mask[i] = True
+            if not staircase.dominates(f1[i], f2[i]):  # skip duplicates
+                staircase.insert(f1[i], f2[i])
+
+    mask = np.empty(n, dtype=bool)
+    mask[order] = sorted_mask
+    return mask
+
+
+def _dominance_matrix(front: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """(front x points) boolean matrix, True where the front point dominates the point"""
+    ## one objective at a time, to avoid (front x points x n_objectives) temporaries
+    le = front[:, None, 0] <= points[None, :, 0]
+    lt = front[:, None, 0] < points[None, :, 0]
+    for j in range(1, points.shape[1]):
+        le &= front[:, None, j] <= points[None, :, j]
+        lt |= front[:, None, j] < points[None, :, j]
+    return le & lt
+
+
+def _dominated_by(front: np.ndarray, points: np.ndarray, chunk_size: int) -> np.ndarray:
+    """For each of the points, whether it is dominated by any point in front (block-vectorized)"""
+    dominated = np.zeros(len(points), dtype=bool)
+    if len(front) == 0 or len(points) == 0:
+        return dominated
+    ## keep the (front_chunk x points) comparison arrays bounded in size
+    front_chunk = max(1, (chunk_size * chunk_size) // max(len(points), 1))
+    for i in range(0, len(front), front_chunk):
+        dominated |= np.any(
+            _dominance_matrix(front[i : i + front_chunk], points), axis=0
+        )
+    return dominated
+
+
+def _non_dominated_mask_nd(F: np.ndarray, chunk_size: int = 1024) -> np.ndarray:
+    """Chunked, block-vectorized filter for any number of objectives.
+
+    Points are processed by increasing sum of objectives: a point can only be dominated by
+    points with a strictly smaller sum, so the front found so far never has to be pruned.
+    """
+    n = len(F)
+    order = np.argsort(F.sum(axis=1), kind="stable")
+    Fs = F[order]
+    sorted_mask = np.zeros(n, dtype=bool)
+    front = np.empty((0, F.shape[1]))
+    for start in range(0, n, chunk_size):
+        block = Fs[start : start + chunk_size]
+        candidates = ~_dominated_by(front, block, chunk_size)
+        block_idx = np.flatnonzero(candidates)
+        ## dominance within the block itself
+        block_idx = block_idx[~_dominated_by(block[block_idx], block[block_idx], chunk_size)]
+        sorted_mask[start + block_idx] = True
+        front = np.concatenate([front, block[block_idx]])
+
+    mask = np.empty(n, dtype=bool)
+    mask[order] = sorted_mask
+    return mask
+
+
+def non_dominated_mask(
+    F: np.ndarray,
+    sense: Optional[Sense] = None,
+    chunk_size: int = 1024,
+) -> np.ndarray:
+    """Boolean mask of the non-dominated (Pareto optimal) rows of F.
+
+    A point is dominated if another point is at least as good in all objectives and
+    strictly better in at least one - thus duplicated points on the front are all kept.
+
+    Args:
+        F (np.ndarray): Objective values, (n_points x n_objectives).
+        sense (optional): 'min' or 'max', for all objectives or one per objective.
+            Defaults to minimizing all objectives.
+        chunk_size (int, optional): Block size for the vectorized (> 3 objectives) path.
+            Bounds memory usage to a few chunk_size**2 booleans.
+    """
+    F = _as_minimization(F, sense)
+    if len(F) == 0:
+        return np.zeros(0, dtype=bool)
+    n_objectives = F.shape[1]
+    if n_objectives == 1:
+        return F[:, 0] == F[:, 0].min()
+    elif n_objectives == 2:
+        return _non_dominated_mask_2d(F)
+    elif n_objectives == 3:
+        return _non_dominated_mask_3d(F)
+    else:
+        return _non_dominated_mask_nd(F, chunk_size=chunk_size)
+
+
+def non_dominated_indices(
+    F: np.ndarray,
+    sense: Optional[Sense] = None,
+    chunk_size: int = 1024,
+) -> np.ndarray:
+    """Positions of the non-dominated rows of F (see `non_dominated_mask`)"""
+    return np.flatnonzero(non_dominated_mask(F, sense=sense, chunk_size=chunk_size))
+
+
+def _non_dominated_ranks_2d(F: np.ndarray) -> np.ndarray:
+    """O(n log n) layer assignment for 2 objectives (Jensen's sweep).
+
+    Points are visited in lexicographic order, so only already visited points can dominate
+    the current one. Each layer is represented by its last point, whose (f1, f0) keys are
+    increasing across layers - the layer of a point is found by binary search.
+    """
+    order = np.lexsort((F[:, 1], F[:, 0]))
+    keys: List[tuple] = []  # (f1, f0) of the last point of each layer
+    sorted_ranks = np.empty(len(F), dtype=int)
+    for pos, (f0, f1) in enumerate(F[order].tolist()):
+        ## layer k dominates the point iff keys[k] < (f1, f0) (equal means duplicated point)
+        k = bisect_left(keys, (f1, f0))
+        if k == len(keys):
+            keys.append((f1, f0))
+        else:
+            keys[k] = (f1, f0)
+        sorted_ranks[pos] = k
+    ranks = np.empty(len(F), dtype=int)
+    ranks[order] = sorted_ranks
+    return ranks
+
+
+def _non_dominated_ranks_3d(F: np.ndarray) -> np.ndarray:
+    """Layer assignment for 3 objectives: sweep on the first objective, keeping one 2D
+    staircase per layer, and binary search over the layers for each point."""
+    n = len(F)
+    order = np.lexsort((F[:, 2], F[:, 1], F[:, 0]))
+    Fs = F[order]
+    f0 = Fs[:, 0]
+    starts = np.flatnonzero(np.r_[True, f0[1:] != f0[:-1]])
+    ends = np.r_[starts[1:], n]
+    f1, f2 = Fs[:, 1].tolist(), Fs[:, 2].tolist()
+
+    staircases: List[_Staircase] = []
+    sorted_ranks = np.empty(n, dtype=int)
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        ## points sharing the first objective (sorted by f1, f2) can dominate each other
+        group: List[int] = []
+
+        def dominated_by_layer(k: int, i: int) -> bool:
+            if k < len(staircases) and staircases[k].dominates(f1[i], f2[i]):
+                return True
+            return any(
+                sorted_ranks[j] == k
+                and f1[j] <= f1[i]
+                and f2[j] <= f2[i]
+                and (f1[j], f2[j]) != (f1[i], f2[i])
+                for j in group
+            )
+
+        n_layers = len(staircases)
+        for i in range(start, end):
+            ## a point dominated by layer k is dominated by all layers before k
+            lo, hi = 0, n_layers
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if dominated_by_layer(mid, i):
+                    lo = mid + 1
+                else:
+                    hi = mid
+            sorted_ranks[i] = lo
+            n_layers = max(n_layers, lo + 1)
+            group.append(i)
+        for i in group:
+            k = sorted_ranks[i]
+            while k >= len(staircases):
+                staircases.append(_Staircase())
+            if not staircases[k].dominates(f1[i], f2[i]):
+                staircases[k].insert(f1[i], f2[i])
+
+    ranks = np.empty(n, dtype=int)
+    ranks[order] = sorted_ranks
+    return ranks
+
+
+def _non_dominated_ranks_nd(F: np.ndarray, chunk_size: int = 1024) -> np.ndarray:
+    """Vectorized Deb sort for any number of objectives, in blocks.
+
+    Points are visited by increasing sum of objectives, so all dominators of a point are
+    visited before it. The layer of each point of a block is found by a (vectorized) binary
+    search over the layers found so far, then corrected for dominance within the block itself.
+    """
+    n = len(F)
+    order = np.argsort(F.sum(axis=1), kind="stable")
+    Fs = F[order]
+    sorted_ranks = np.empty(n, dtype=int)
+    layers: List[np.ndarray] = []
+    for start in range(0, n, chunk_size):
+        block = Fs[start : start + chunk_size]
+        lo = np.zeros(len(block), dtype=int)
+        hi = np.full(len(block), len(layers))
+        while np.any(lo < hi):
+            active = np.flatnonzero(lo < hi)
+            mid = (lo[active] + hi[active]) // 2
+            for k in np.unique(mid).tolist():
+                idx = active[mid == k]
+                dominated = _dominated_by(layers[k], block[idx], chunk_size)
+                lo[idx[dominated]] = k + 1
+                hi[idx[~dominated]] = k
+
+        ## within the block: a point is at least one layer after any of its dominators
+        dominates = _dominance_matrix(block, block)
+        block_ranks = lo
+        while True:
+            from_block = np.where(dominates, block_ranks[:, None] + 1, 0).max(axis=0)
+            new_ranks = np.maximum(lo, from_block)
+            if np.array_equal(new_ranks, block_ranks):
+                break
+            block_ranks = new_ranks
+
+        for k in np.unique(block_ranks).tolist():
+            members = block[block_ranks == k]
+            if k == len(layers):
+                layers.append(members)
+            else:
+                layers[k] = np.concatenate([layers[k], members])
+        sorted_ranks[start : start + len(block)] = block_ranks
+
+    ranks = np.empty(n, dtype=int)
+    ranks[order] = sorted_ranks
+    return ranks
+
+
+def crowding_distance(F: np.ndarray, ranks: np.ndarray) -> np.ndarray:
+    """NSGA-II crowding distance of each point within its layer (vectorized over all layers).
+    Extreme points of each layer get an infinite distance."""
+    F = np.asarray(F, dtype=float)
+    n = len(F)
+    distance = np.zeros(n)
+    if n == 0:
+        return distance
+    for j in range(F.shape[1]):
+        order = np.lexsort((F[:, j], ranks))
+        r, v = ranks[order], F[order, j]
+        first = np.r_[True, r[1:] != r[:-1]]
+        last = np.r_[r[1:] != r[:-1], True]
+        starts = np.flatnonzero(first)
+        sizes = np.diff(np.r_[starts, n])
+        value_range = np.repeat(v[last] - v[first], sizes)
+        gap = np.zeros(n)
+        interior = ~(first | last)
+        gap[1:-1] = v[2:] - v[:-2]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            contribution = np.where(value_range > 0, gap / value_range, 0.0)
+        contribution = np.where(interior, contribution, np.inf)
+        distance[order] += contribution
+    return distance
+
+
+def non_dominated_sort(
+    F: np.ndarray,
+    sense: Optional[Sense] = None,
+    chunk_size: int = 1024,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Assign every row of F to its non-dominated layer, as Dakota's `layer_rank` fitness does.
+
+    Args:
+        F (np.ndarray): Objective values, (n_points x n_objectives).
+        sense (optional): 'min' or 'max', for all objectives or one per objective.
+        chunk_size (int, optional): Block size for the vectorized (> 3 objectives) path.
+
+    Returns:
+        ranks: Layer of each point; 0 is the Pareto front.
+        crowding: Crowding distance of each point within its layer.
+    """
+    F = _as_minimization(F, sense)
+    if len(F) == 0:
+        return np.zeros(0, dtype=int), np.zeros(0)
+    n_objectives = F.shape[1]
+    if n_objectives == 1:
+        ranks = np.unique(F[:, 0], return_inverse=True)[1].ravel()
+    elif n_objectives == 2:
+        ranks = _non_dominated_ranks_2d(F)
+    elif n_objectives == 3:
+        ranks = _non_dominated_ranks_3d(F)
+    else:
+        ranks = _non_dominated_ranks_nd(F, chunk_size=chunk_size)
+    return ranks, crowding_distance(F, ranks)
+
+
+def select_elites(
+    F: np.ndarray,
+    n: int,
+    sense: Optional[Sense] = None,
+) -> np.ndarray:
+    """Positions of the n best rows of F - by layer, then by decreasing crowding distance -
+    e.g. to warm-start a MOGA population."""
+    ranks, crowding = non_dominated_sort(F, sense=sense)
+    return np.lexsort((-crowding, ranks))[:n]
+
+
+class ParetoArchive:
+    """Non-dominated archive, updated incrementally as evaluations come in.
+
+    Each inserted point costs O(front size) - there is no recomputation from scratch.
+    The archive can be snapshotted to disk (atomically, as .npz) so that the live front of a
+    running study can be inspected with `ParetoArchive.load` without reparsing any tabular file.
+
+    Args:
+        sense (optional): 'min' or 'max', for all objectives or one per objective.
+        snapshot_path (optional): If given, the archive is saved there after every update
+            that changed the front.
+        objective_labels / input_labels (optional): Names stored along with the snapshot.
+    """
+
+    def __init__(
+        self,
+        sense: Optional[Sense] = None,
+        snapshot_path: Optional[Union[str, Path]] = None,
+        objective_labels: Optional[List[str]] = None,
+        input_labels: Optional[List[str]] = None,
+    ):
+        self.sense = sense
+        self.snapshot_path = Path(snapshot_path) if snapshot_path is not None else None
+        self.objective_labels = objective_labels
+        self.input_labels = input_labels
+        self.n_evaluations = 0
+        self._F: Optional[np.ndarray] = None  # front, as minimization
+        self._X: Optional[np.ndarray] = None  # inputs of the front points
+
+    def __len__(self):
+        return 0 if self._F is None else len(self._F)
+
+    @property
+    def front(self) -> np.ndarray:
+        """Objective values of the non-dominated points (in their original sense)"""
+        if self._F is None:
+            return np.empty((0, 0))
+        return _as_minimization(self._F, self.sense)  # the sign flip is its own inverse
+
+    @property
+    def inputs(self) -> np.ndarray:
+        """Inputs (variables) that produced each of the front points"""
+        return np.empty((0, 0)) if self._X is None else self._X.copy()
+
+    def update(self, F: np.ndarray, X: Optional[np.ndarray] = None) -> np.ndarray:
+        """Insert a batch of objective values F (and their inputs X).
+        Returns a mask of the points of the batch that entered the front."""
+        F = _as_minimization(F, self.sense)
+        X = np.empty((len(F), 0)) if X is None else np.array(X, dtype=float, ndmin=2)
+        assert len(X) == len(F), "There must be one input per objective vector"
+        self.n_evaluations += len(F)
+        accepted = np.zeros(len(F), dtype=bool)
+        if len(F) == 0:
+            return accepted
+        if self._F is None:
+            self._F = np.empty((0, F.shape[1]))
+            self._X = np.empty((0, X.shape[1]))
+
+        ## only points non-dominated within the batch can enter the front
+        for i in np.flatnonzero(non_dominated_mask(F)):
+            p = F[i]
+            le = np.all(self._F <= p, axis=1)
+            if np.any(le & np.any(self._F < p, axis=1)):
+                continue
+            ## re-evaluations of a point already in the front are not stored twice
+            same = le & np.all(self._F >= p, axis=1)
+            if np.any(same & np.all(self._X == X[i], axis=1)):
+                continue
+            ## drop the front points dominated by the new one
+            keep = ~(np.all(p <= self._F, axis=1) & np.any(p < self._F, axis=1))
+            self._F = np.concatenate([self._F[keep], p[None, :]])
+            self._X = np.concatenate([self._X[keep], X[i][None, :]])
+            accepted[i] = True
+
+        if self.snapshot_path is not None and accepted.any():
+            self.save()
+        return accepted
+
+    def save(self, path: Optional[Union[str, Path]] = None) -> Path:
+        """Atomically write the archive to path (defaults to snapshot_path)"""
+        path = Path(path) if path is not None else self.snapshot_path
+        assert path is not None, "No path given to save the archive"
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                front=self.front,
+                inputs=self.inputs,
+                n_evaluations=self.n_evaluations,
+                sense=np.array(
+                    [self.sense] if isinstance(self.sense, str) else self.sense or []
+                ),
+                objective_labels=np.array(self.objective_labels or []),
+                input_labels=np.array(self.input_labels or []),
+            )
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path], **kwargs) -> "ParetoArchive":
+        """Load a snapshot written by `save` (kwargs are passed to the constructor)"""
+        with np.load(path) as data:
+            sense = data["sense"].tolist()
+            archive = cls(
+                sense=(sense[0] if len(sense) == 1 else sense) or None,
+                objective_labels=data["objective_labels"].tolist() or None,
+                input_labels=data["input_labels"].tolist() or None,
+                **kwargs,
+            )
+            front, inputs = data["front"], data["inputs"]
+            if front.size:
+                archive._F = _as_minimization(front, archive.sense)
+                archive._X = inputs
+            archive.n_evaluations = int(data["n_evaluations"])
+        return archive
+
+    def to_dataframe(self) -> "pd.DataFrame":
+        """Front (and inputs) as a DataFrame, using the labels if available"""
+        import pandas as pd  # not needed by the evaluators, which import this module
+
+        front, inputs = self.front, self.inputs
+        columns = self.objective_labels or [
+            f"Objective{j + 1}" for j in range(front.shape[1])
+        ]
+        input_columns = self.input_labels or [f"x{j + 1}" for j in range(inputs.shape[1])]
+        return pd.concat(
+            [
+                pd.DataFrame(inputs, columns=input_columns),
+                pd.DataFrame(front, columns=columns),
+            ],
+            axis=1,
+        )
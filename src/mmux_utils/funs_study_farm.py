@@ -0,0 +1,159 @@
+### Run many Dakota studies (eg a sweep of seeds / population sizes / surrogates built with
+### funs_create_dakota_conf) in parallel - each in its own run directory and worker process,
+### as the (pybind11) Dakota state cannot be shared between studies of the same process.
+from typing import Callable, List, Optional, Sequence, Union
+from pathlib import Path
+from dataclasses import dataclass
+import multiprocessing
+import multiprocessing.connection
+import os
+import time
+import traceback
+from mmux_utils.funs_evaluate import create_run_dir, run_dakota
+
+
+@dataclass
+class StudyResult:
+    name: str
+    run_dir: Path
+    status: str  # "ok", "failed" (exception raised), "crashed" (worker died) or "timeout"
+    elapsed: float
+    error: Optional[str] = None
+    exitcode: Optional[int] = None
+    results_file: Optional[Path] = None
+
+
+def _run_study(
+    conn,
+    run_dir: Path,
+    dakota_conf_path: Path,
+    evaluator: Optional[Callable],
+    batch_mode: bool,
+    dakota_module: str,
+):
+    """Worker process: run one study within its run directory, report to the parent via conn"""
+    try:
+        os.chdir(run_dir)
+        run_dakota(
+            dakota_conf_path,
+            batch_mode=batch_mode,
+            evaluator=evaluator,
+            dakota_module=dakota_module,
+        )
+        conn.send(("ok", None))
+    except BaseException:
+        conn.send(("failed", traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+def _find_results_file(run_dir: Path) -> Optional[Path]:
+    results_file = run_dir / "results.dat"  # the default of funs_create_dakota_conf
+    if results_file.exists():
+        return results_file
+    dat_files = sorted(run_dir.glob("*.dat"))
+    return dat_files[0] if dat_files else None
+
+
+def run_studies(
+    configs: Sequence[str],
+    script_dir: Path,
+    evaluator: Union[Optional[Callable], Sequence[Optional[Callable]]] = None,
+    names: Optional[Sequence[str]] = None,
+    max_workers: Optional[int] = None,
+    batch_mode: bool = True,
+    dakota_module: str = "dakota.environment",
+    timeout: Optional[float] = None,
+) -> List[StudyResult]:
+    """Run each Dakota config in its own run directory (`create_run_dir(script_dir, name)`) and
+    its own (spawned) worker process, at most max_workers at a time. A study that fails, crashes
+    or times out is reported in its StudyResult and does not stop the others.
+
+    Args:
+        configs: Dakota input strings, one per study.
+        script_dir: Parent of the "runs" directory.
+        evaluator (optional): Callback (or one per study) as in `run_dakota`; must be picklable.
+        names (optional): Run directory names - must be unique; "study_{i}" by default.
+        max_workers (int, optional): Number of studies run at once; os.cpu_count() by default.
+        dakota_module (str, optional): Module providing `study` - eg "mmux_utils.funs_fake_dakota"
+            to test the farm without Dakota.
+        timeout (float, optional): Seconds after which a study is terminated.
+
+    Returns:
+        List[StudyResult]: In the order of configs.
+    """
+    names = list(names) if names is not None else [f"study_{i}" for i in range(len(configs))]
+    if len(names) != len(configs) or len(set(names)) != len(names):
+        raise ValueError("names must be unique, one per config")
+    if callable(evaluator) or evaluator is None:
+        evaluator = [evaluator] * len(configs)
+    max_workers = max_workers or os.cpu_count() or 1
+    ctx = multiprocessing.get_context("spawn")
+
+    results: List[Optional[StudyResult]] = [None] * len(configs)
+    pending = list(range(len(configs)))[::-1]
+    running = {}  # sentinel -> (index, process, connection, run_dir, start time)
+    while pending or running:
+        while pending and len(running) < max_workers:
+            i = pending.pop()
+            run_dir = create_run_dir(script_dir, names[i]).resolve()
+            dakota_conf_path = run_dir / "dakota.in"
+            dakota_conf_path.write_text(configs[i])
+            parent_conn, child_conn = ctx.Pipe(duplex=False)
+            process = ctx.Process(
+                target=_run_study,
+                args=(
+                    child_conn,
+                    run_dir,
+                    dakota_conf_path,
+                    evaluator[i],
+                    batch_mode,
+                    dakota_module,
+                ),
+                name=names[i],
+            )
+            process.start()
+            child_conn.close()
+            running[process.sentinel] = (i, process, parent_conn, run_dir, time.monotonic())
+
+        wait_timeout = None
+        if timeout is not None:
+            oldest = min(start for *_, start in running.values())
+            wait_timeout = max(0.0, oldest + timeout - time.monotonic())
+        ## wait on the connections too: a worker sending a large report only exits once it is read
+        ready = multiprocessing.connection.wait(
+            [obj for sentinel, (_, _, conn, *_) in running.items() for obj in (sentinel, conn)],
+            timeout=wait_timeout,
+        )
+
+        now = time.monotonic()
+        for sentinel in list(running):
+            i, process, conn, run_dir, start = running[sentinel]
+            finished = sentinel in ready or conn in ready
+            timed_out = timeout is not None and now - start >= timeout
+            if not finished and not timed_out:
+                continue
+            status, error = "crashed", None
+            if finished:
+                if conn.poll():
+                    try:
+                        status, error = conn.recv()
+                    except EOFError:  # died without reporting
+                        pass
+            else:
+                process.terminate()
+                status = "timeout"
+            process.join()
+            conn.close()
+            results[i] = StudyResult(
+                name=names[i],
+                run_dir=run_dir,
+                status=status,
+                elapsed=now - start,
+                error=error,
+                exitcode=process.exitcode,
+                results_file=_find_results_file(run_dir),
+            )
+            print(f"Study {names[i]}: {status} ({now - start:.1f}s)")
+            del running[sentinel]
+    return results
@@ -0,0 +1,137 @@
+### Incremental tracking of surrogate accuracy along a surrogate_based_global run
+### (finaldata{i}.dat = surrogate predictions, finaldatatruth{i}.dat = truth evaluations)
+from typing import Dict, List, Optional, Tuple, Union
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+
+def get_dakota_descriptors(dakota_file: Union[str, Path]) -> Tuple[List[str], List[str]]:
+    """Variable and response descriptors declared in a Dakota input file"""
+    with open(dakota_file, "r") as f:
+        lines = f.readlines()
+    variables, responses = [], []
+    for i, l in enumerate(lines):
+        if "descriptors" in l and "variables" in lines[i - 1]:
+            variables = [v[1:-1] for v in l.split()[1:]]  # remove quotes
+        if "descriptors" in l and "responses" in lines[i - 1]:
+            responses = [r[1:-1] for r in l.split()[1:]]  # remove quotes
+    return variables, responses
+
+
+def _read_finaldata(path: Path) -> np.ndarray:
+    return pd.read_csv(path, sep=r"\s+", header=None, engine="c").to_numpy(dtype=float)
+
+
+def _match_rows(X: np.ndarray, X_truth: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Pairs (i, j) of rows of X and X_truth with the same variables, as pandas.merge(how="left")
+    pairs them: every match of each row of X, in order - and (i, -1) if there is none"""
+    if (
+        X.shape == X_truth.shape
+        and np.array_equal(X, X_truth)
+        and len(np.unique(X, axis=0)) == len(X)
+    ):
+        rows = np.arange(len(X))  # same (distinct) points, same order - the usual case
+        return rows, rows
+    ## exact match on the bytes of each row (+ 0.0 so that -0.0 == 0.0)
+    X, X_truth = np.ascontiguousarray(X + 0.0), np.ascontiguousarray(X_truth + 0.0)
+    truth_rows: Dict[bytes, List[int]] = {}
+    for j, x in enumerate(X_truth):
+        truth_rows.setdefault(x.tobytes(), []).append(j)
+    left, right = [], []
+    for i, x in enumerate(X):
+        matches = truth_rows.get(x.tobytes(), [-1])
+        left += [i] * len(matches)
+        right += matches
+    return np.array(left, dtype=int), np.array(right, dtype=int)
+
+
+class SurrogateConvergenceTracker:
+    """MAE / RMSE / STD of the surrogate predictions against the truth evaluations, per iteration
+    and response. Each `update` only reads the iterations not seen yet, so it can be polled
+    during a live surrogate_based_global run at negligible cost. As Dakota may still be writing
+    the files of the last iteration, those are only read once the next iteration's files exist,
+    or when the run is marked as finished.
+
+    Args:
+        opt_dir: Directory of the run.
+        variables / responses (optional): Descriptors; read from dakota_file if not given.
+        dakota_file (str, optional): Dakota input file (within opt_dir) to read them from.
+    """
+
+    def __init__(
+        self,
+        opt_dir: Union[str, Path],
+        variables: Optional[List[str]] = None,
+        responses: Optional[List[str]] = None,
+        dakota_file: str = "dakota_sumo_opt.in",
+    ):
+        self.opt_dir = Path(opt_dir)
+        if variables is None or responses is None:
+            file_variables, file_responses = get_dakota_descriptors(
+                self.opt_dir / dakota_file
+            )
+            variables = file_variables if variables is None else variables
+            responses = file_responses if responses is None else responses
+        self.variables = list(variables)
+        self.responses = list(responses)
+        self._mae: List[np.ndarray] = []
+        self._rms: List[np.ndarray] = []
+        self._std: List[np.ndarray] = []
+
+    @property
+    def n_iterations(self) -> int:
+        return len(self._mae)
+
+    def _iteration_paths(self, iteration: int) -> Tuple[Path, Path]:
+        return (
+            self.opt_dir / f"finaldata{iteration}.dat",
+            self.opt_dir / f"finaldatatruth{iteration}.dat",
+        )
+
+    def update(self, finished: bool = False) -> int:
+        """Ingest the new (complete) iterations; returns how many there were.
+        If finished, the files of the last iteration are read too."""
+        n_variables = len(self.variables)
+        n_new = 0
+        while True:
+            iteration = self.n_iterations + 1
+            finaldata_path, finaltruthdata_path = self._iteration_paths(iteration)
+            if not (finaldata_path.exists() and finaltruthdata_path.exists()):
+                break
+            if not finished and not all(
+                p.exists() for p in self._iteration_paths(iteration + 1)
+            ):
+                break  # may still be being written
+
+            data = _read_finaldata(finaldata_path)
+            data_truth = _read_finaldata(finaltruthdata_path)
+            left, right = _match_rows(data[:, :n_variables], data_truth[:, :n_variables])
+            truth = np.full((len(left), len(self.responses)), np.nan)
+            truth[right >= 0] = data_truth[right[right >= 0], n_variables:]
+            errors = data[left, n_variables:] - truth
+
+            self._mae.append(np.nanmean(np.abs(errors), axis=0))
+            self._rms.append(np.nanmean(errors**2, axis=0) ** 0.5)
+            self._std.append(np.nanstd(errors**2, axis=0, ddof=1) ** 0.5)
+            n_new += 1
+        return n_new
+
+    def _as_dataframe(self, values: List[np.ndarray]) -> pd.DataFrame:
+        return pd.DataFrame(
+            np.reshape(values, (len(values), len(self.responses))),
+            columns=self.responses,
+            index=pd.RangeIndex(1, len(values) + 1, name="iteration"),
+        )
+
+    @property
+    def mae(self) -> pd.DataFrame:
+        return self._as_dataframe(self._mae)
+
+    @property
+    def rms(self) -> pd.DataFrame:
+        return self._as_dataframe(self._rms)
+
+    @property
+    def std(self) -> pd.DataFrame:
+        return self._as_dataframe(self._std)
@@ -0,0 +1,302 @@
+### Opt-in tracing of the Dakota callback path: where the wall time of a study goes between Dakota
+### itself, the evaluator callbacks (marshalling, scheduling) and the model.
+from typing import Callable, Dict, List, Optional, TextIO, Union
+from pathlib import Path
+import cProfile
+import json
+import os
+import threading
+import time
+import uuid
+from mmux_utils.funs_evaluate import accepts_on_result
+
+## one open trace file per (process, path) - worker processes write their own,
+## trace.<session>.<pid>.jsonl, the session identifying the EvaluationTracer
+_WRITERS: Dict[Path, TextIO] = {}
+_WRITERS_LOCK = threading.Lock()
+
+
+def _write_record(path: Path, record: dict):
+    with _WRITERS_LOCK:
+        f = _WRITERS.get(path)
+        if f is None or f.closed:
+            f = _WRITERS[path] = open(path, "a", encoding="utf-8")
+        f.write(json.dumps(record) + "\n")
+        f.flush()  # worker processes may never close their file
+
+
+def _trace_path(run_dir: Path, session: str) -> Path:
+    return run_dir / f"trace.{session}.{os.getpid()}.jsonl"
+
+
+def _close_writers(run_dir: Path, session: str):
+    with _WRITERS_LOCK:
+        for path in [
+            p for p in _WRITERS if p.parent == run_dir and p.name.startswith(f"trace.{session}.")
+        ]:
+            _WRITERS.pop(path).close()
+
+
+class _TracedModel:
+    """Model wrapper recording each evaluation into trace.<session>.<pid>.jsonl (picklable, so
+    that it can be sent to the workers of a ParallelBatchEvaluator)"""
+
+    def __init__(
+        self, model: Callable, run_dir: Path, session: str, profile_every: Optional[int]
+    ):
+        self.model = model
+        self.run_dir = run_dir
+        self.session = session
+        self.profile_every = profile_every
+        self._n_calls = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        state["_n_calls"] = 0
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def __call__(self, input: dict):
+        with self._lock:
+            self._n_calls += 1
+            n_call = self._n_calls
+        profile = self.profile_every is not None and n_call % self.profile_every == 0
+
+        start = time.time()
+        if profile:
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.model, input)
+        else:
+            response = self.model(input)
+        end = time.time()
+
+        pid = os.getpid()
+        record = {
+            "type": "evaluation",
+            "eval_id": input.get("eval_id") if isinstance(input, dict) else None,
+            "start": start,
+            "end": end,
+            "pid": pid,
+            "thread": threading.get_ident(),
+        }
+        if profile:
+            profile_path = (
+                self.run_dir / "profiles" / f"evaluation_{self.session}_{pid}_{n_call}.prof"
+            )
+            profile_path.parent.mkdir(exist_ok=True)
+            profiler.dump_stats(profile_path)
+            record["profile"] = str(profile_path)
+        _write_record(_trace_path(self.run_dir, self.session), record)
+        return response
+
+
+class _TracedEvaluator:
+    """Evaluator callback wrapper recording each call (batch) of Dakota - on_result is passed on
+    to the wrapped evaluator, if it takes one"""
+
+    def __init__(self, evaluator: Callable, run_dir: Path, session: str, batch_mode: bool):
+        self.evaluator = evaluator
+        self.run_dir = run_dir
+        self.session = session
+        self.batch_mode = batch_mode
+        self._n_batches = 0
+        self._last_end: Optional[float] = None
+
+    def __call__(
+        self,
+        input: Union[dict, List[dict]],
+        on_result: Optional[Callable[[int, dict], None]] = None,
+    ):
+        start = time.time()
+        if self.batch_mode and on_result is not None and accepts_on_result(self.evaluator):
+            response = list(self.evaluator(input, on_result=on_result))
+        elif self.batch_mode:
+            response = list(self.evaluator(input))  # eg batch_evaluator returns a lazy map
+        else:
+            response = self.evaluator(input)
+        end = time.time()
+
+        self._n_batches += 1
+        pid = os.getpid()
+        _write_record(
+            _trace_path(self.run_dir, self.session),
+            {
+                "type": "batch",
+                "batch": self._n_batches,
+                "batch_size": len(input) if self.batch_mode else 1,
+                "start": start,
+                "end": end,
+                ## time spent in Dakota since the previous callback returned
+                "dakota_time": start - self._last_end if self._last_end else None,
+                "pid": pid,
+                "thread": threading.get_ident(),
+            },
+        )
+        self._last_end = end
+        return response
+
+
+def _union_length(intervals: List[tuple]) -> float:
+    total, current_start, current_end = 0.0, None, None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+class EvaluationTracer:
+    """Records, for every evaluation of a study, its start / end times, batch, queue wait (from
+    the start of its batch) and model time - and for every batch, the time Dakota spent before
+    calling it and the marshalling time (time in the callback while no model was running).
+    Every profile_every-th evaluation (per process) is run under cProfile, dumped into
+    run_dir/profiles. On `close`, the records are merged into run_dir/trace.jsonl and
+    run_dir/trace.json (Chrome trace format - open in chrome://tracing or Perfetto). Each tracer
+    only merges its own records, so tracing again in the same run_dir starts from scratch.
+
+    When not enabled, `wrap_model` / `wrap_evaluator` return their argument unchanged, so that
+    tracing costs nothing unless asked for:
+
+        tracer = EvaluationTracer(run_dir, enabled=trace)
+        evaluator = functools.partial(batch_evaluator_local, tracer.wrap_model(model))
+        run_dakota(dakota_conf_path, evaluator=tracer.wrap_evaluator(evaluator))
+        tracer.close()
+
+    Args:
+        run_dir: Directory of the run, where the traces are written.
+        enabled (bool, optional): Whether to trace at all.
+        profile_every (int, optional): Profile one evaluation out of profile_every (none if None).
+    """
+
+    def __init__(
+        self,
+        run_dir: Union[str, Path],
+        enabled: bool = True,
+        profile_every: Optional[int] = None,
+    ):
+        self.run_dir = Path(run_dir).resolve()
+        self.enabled = enabled
+        self.profile_every = profile_every
+        self.session = uuid.uuid4().hex[:12]  # names this tracer's per-process trace files
+        self.records: List[dict] = []
+
+    def wrap_model(self, model: Callable) -> Callable:
+        if not self.enabled:
+            return model
+        return _TracedModel(model, self.run_dir, self.session, self.profile_every)
+
+    def wrap_evaluator(self, evaluator: Callable, batch_mode: bool = True) -> Callable:
+        if not self.enabled:
+            return evaluator
+        return _TracedEvaluator(evaluator, self.run_dir, self.session, batch_mode)
+
+    def _read_records(self) -> List[dict]:
+        records = []
+        for path in sorted(self.run_dir.glob(f"trace.{self.session}.*.jsonl")):
+            with open(path, encoding="utf-8") as f:
+                records += [json.loads(line) for line in f if line.endswith("\n")]
+        return records
+
+    def _link_records(self, records: List[dict]):
+        """Assign evaluations to the batch running when they started, and compute queue waits
+        and per-batch model / marshalling times"""
+        batches = sorted(
+            (r for r in records if r["type"] == "batch"), key=lambda r: r["start"]
+        )
+        evaluations = sorted(
+            (r for r in records if r["type"] == "evaluation"), key=lambda r: r["start"]
+        )
+        starts = [b["start"] for b in batches]
+        intervals: Dict[int, List[tuple]] = {b["batch"]: [] for b in batches}
+        i_batch = -1
+        for evaluation in evaluations:
+            evaluation["model_time"] = evaluation["end"] - evaluation["start"]
+            while i_batch + 1 < len(starts) and starts[i_batch + 1] <= evaluation["start"]:
+                i_batch += 1
+            if i_batch >= 0 and evaluation["start"] <= batches[i_batch]["end"]:
+                batch = batches[i_batch]
+                evaluation["batch"] = batch["batch"]
+                evaluation["queue_wait"] = evaluation["start"] - batch["start"]
+                intervals[batch["batch"]].append((evaluation["start"], evaluation["end"]))
+        for batch in batches:
+            batch_intervals = intervals[batch["batch"]]
+            batch["callback_time"] = batch["end"] - batch["start"]
+            batch["model_time"] = sum(end - start for start, end in batch_intervals)
+            if batch_intervals:
+                batch["marshalling_time"] = batch["callback_time"] - _union_length(
+                    batch_intervals
+                )
+
+    def _write_chrome_trace(self, records: List[dict]):
+        t0 = min((r["start"] for r in records), default=0.0)
+
+        def event(name: str, start: float, end: float, pid: int, tid: int, args: dict):
+            return {
+                "name": name,
+                "ph": "X",
+                "ts": (start - t0) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": pid,
+                "tid": tid,
+                "args": args,
+            }
+
+        events = []
+        for r in records:
+            if r["type"] == "batch":
+                events.append(
+                    event(f"batch {r['batch']}", r["start"], r["end"], r["pid"], 0, r)
+                )
+                if r.get("dakota_time"):
+                    start = r["start"] - r["dakota_time"]
+                    events.append(event("dakota", start, r["start"], r["pid"], 0, {}))
+            else:
+                name = f"evaluation {r['eval_id']}" if r["eval_id"] is not None else "evaluation"
+                events.append(event(name, r["start"], r["end"], r["pid"], r["thread"], r))
+        with open(self.run_dir / "trace.json", "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def close(self) -> List[dict]:
+        """Merge the records of all processes into trace.jsonl and trace.json; returns them"""
+        if not self.enabled:
+            return []
+        _close_writers(self.run_dir, self.session)
+        records = self._read_records()
+        self._link_records(records)
+        records.sort(key=lambda r: (r["start"], r["type"] != "batch"))
+        with open(self.run_dir / "trace.jsonl", "w", encoding="utf-8") as f:
+            for r in records:
+                f.write(json.dumps(r) + "\n")
+        self._write_chrome_trace(records)
+        self.records = records
+        return records
+
+    def summary(self) -> Dict[str, float]:
+        """Totals (in seconds) over the closed trace"""
+        batches = [r for r in self.records if r["type"] == "batch"]
+        evaluations = [r for r in self.records if r["type"] == "evaluation"]
+        return {
+            "n_batches": len(batches),
+            "n_evaluations": len(evaluations),
+            "dakota_time": sum(b["dakota_time"] or 0.0 for b in batches),
+            "callback_time": sum(b["callback_time"] for b in batches),
+            "model_time": sum(e["model_time"] for e in evaluations),
+            "marshalling_time": sum(b.get("marshalling_time", 0.0) for b in batches),
+            "queue_wait": sum(e.get("queue_wait", 0.0) for e in evaluations),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
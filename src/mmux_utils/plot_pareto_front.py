@@ -3,26 +3,31 @@ from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 from matplotlib import gridspec
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 import matplotlib.patches as patches
+from matplotlib.collections import LineCollection, PatchCollection, PolyCollection
+from matplotlib.colors import LogNorm
+from matplotlib.figure import Figure
 import numpy as np
 import pandas as pd
-from typing import Union, Optional, Tuple, Callable
+from dataclasses import dataclass, field
+from typing import Dict, List, Union, Optional, Sequence, Tuple, Callable
 from pathlib import Path
+from mmux_utils.funs_pareto import Sense, non_dominated_mask
 
 
 def is_dominated(point: np.ndarray, other_points: np.ndarray):
     return any(all(point >= other) for other in other_points)
 
 
-def get_non_dominated_indices(data, sort_by_column="Objective1"):
-    data = data.copy()
-    non_dominated_indices = []
-    for i, point in data.iterrows():
-        if not is_dominated(point.values, data.drop(i).values):  # type: ignore
-            non_dominated_indices.append(i)
+def get_non_dominated_indices(
+    data: pd.DataFrame,
+    sort_by_column: str = "Objective1",
+    sense: Optional[Sense] = None,
+):
+    """Index labels of the non-dominated rows of data (all columns are objectives),
+    sorted by sort_by_column. See `funs_pareto.non_dominated_mask` for sense."""
+    mask = non_dominated_mask(np.asarray(data.values, dtype=float), sense=sense)
 
-    sorted_indices = (
-        data.loc[non_dominated_indices].sort_values(by=sort_by_column).index.values
-    )
+    sorted_indices = data.loc[mask].sort_values(by=sort_by_column).index.values
 
     return sorted_indices
 
@@ -39,6 +44,25 @@ def load_data_dakota_free_pulse_optimization(
     return data
 
 
+def _bin_counts(
+    x: np.ndarray,
+    y: np.ndarray,
+    bins: Union[int, Tuple[int, int]],
+    xlim: Tuple[float, float],
+    ylim: Tuple[float, float],
+) -> np.ndarray:
+    """(n_ybins x n_xbins) counts of the points within xlim x ylim, on a regular grid -
+    computed with a single bincount (much faster than np.histogram2d for millions of points)"""
+    n_x, n_y = (bins, bins) if np.isscalar(bins) else bins
+    i = np.floor((np.asarray(x, dtype=float) - xlim[0]) * (n_x / (xlim[1] - xlim[0])))
+    j = np.floor((np.asarray(y, dtype=float) - ylim[0]) * (n_y / (ylim[1] - ylim[0])))
+    ## points on the upper limits go into the last bins, as in np.histogram2d
+    i[x == xlim[1]], j[y == ylim[1]] = n_x - 1, n_y - 1
+    inside = (i >= 0) & (i < n_x) & (j >= 0) & (j < n_y)
+    flat = j[inside].astype(np.intp) * n_x + i[inside].astype(np.intp)
+    return np.bincount(flat, minlength=n_x * n_y).reshape(n_y, n_x)
+
+
 def plot_objective_space(
     F: Union[pd.DataFrame, np.ndarray],
     ax: Optional[plt.Axes] = None,
@@ -49,15 +73,51 @@ def plot_objective_space(
     ylabel: str = "Activation (%)",
     title: str = "Objective Space",
     facecolors: str = "none",
+    ranks: Optional[np.ndarray] = None,
+    cmap: str = "viridis_r",
+    density: bool = False,
+    bins: Union[int, Tuple[int, int]] = 400,
+    show_front: bool = False,
+    sense: Optional[Sense] = None,
+    front_color: str = "red",
 ):
-    """Plot the objective space of a set of points F."""
+    """Plot the objective space of a set of points F.
+    If ranks are given (e.g. from `funs_pareto.non_dominated_sort`), points are colored by them.
+
+    If density, points are binned (within xlim / ylim) into a bins x bins 2D histogram drawn as a
+    single raster image - so that render time and file size do not grow with the number of points.
+    If show_front, the Pareto front (see `funs_pareto.non_dominated_mask` for sense) is drawn on
+    top as exact vector points and line.
+    """
     if isinstance(F, pd.DataFrame):
         F = F.values
 
     if ax is None:
         ax = plt.subplots(figsize=(10, 10))[1]
 
-    plt.scatter(F[:, 1], F[:, 0], s=30, facecolors=facecolors, edgecolors=color)
+    if density:
+        counts = np.ma.masked_equal(_bin_counts(F[:, 1], F[:, 0], bins, xlim, ylim), 0)
+        plt.imshow(
+            counts,
+            origin="lower",
+            extent=(*xlim, *ylim),
+            aspect="auto",
+            interpolation="nearest",
+            cmap=cmap,
+            norm=LogNorm(vmin=1, vmax=max(1, counts.max())),
+        )
+        plt.colorbar(label="Points per bin")
+    elif ranks is None:
+        plt.scatter(F[:, 1], F[:, 0], s=30, facecolors=facecolors, edgecolors=color)
+    else:
+        plt.scatter(F[:, 1], F[:, 0], s=30, c=ranks, cmap=cmap)
+        plt.colorbar(label="Pareto layer")
+
+    if show_front:
+        front = F[non_dominated_mask(np.asarray(F[:, :2], dtype=float), sense=sense)]
+        front = front[np.argsort(front[:, 1], kind="stable")]
+        plt.plot(front[:, 1], front[:, 0], "-", color=front_color, linewidth=1, zorder=3)
+        plt.scatter(front[:, 1], front[:, 0], s=20, color=front_color, zorder=4)
     plt.xlabel(xlabel)
     plt.ylabel(ylabel)
     plt.xlim(xlim)
@@ -172,3 +232,240 @@ def add_inset_pulses(
         alpha=0.75,
     )
     ax.add_patch(arrow)
+
+
+def _freeze(value):
+    """Hashable version of (nested) pulse arguments - eg a row of X as an array"""
+    if isinstance(value, np.ndarray):
+        return tuple(value.ravel().tolist())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _decimate_minmax(x: np.ndarray, y: np.ndarray, max_points: int):
+    """Keep the min and max of y within max_points // 2 buckets of x (in their original order),
+    so that peaks (eg of a pulse train) survive the decimation"""
+    n = len(x)
+    if max_points is None or n <= max_points:
+        return x, y
+    n_buckets = max(1, max_points // 2)
+    edges = np.linspace(0, n, n_buckets + 1).astype(int)
+    keep = [0, n - 1]
+    for start, end in zip(edges[:-1], edges[1:]):
+        keep += [start + int(np.argmin(y[start:end])), start + int(np.argmax(y[start:end]))]
+    keep = np.unique(keep)
+    return x[keep], y[keep]
+
+
+@dataclass
+class PulseTraces:
+    """What `pulse.plot_pulse` draws, as plain data: lines and filled areas (eg +- std)"""
+
+    lines: List[Tuple[np.ndarray, dict]] = field(default_factory=list)  # (xy, style)
+    areas: List[Tuple[np.ndarray, dict]] = field(default_factory=list)  # (vertices, style)
+    xlim: Tuple[float, float] = (0.0, 1.0)
+    ylim: Tuple[float, float] = (0.0, 1.0)
+
+
+class PulseInsetRenderer:
+    """Draws the pulse insets of many Pareto points at once (instead of one inset axes per point,
+    as `add_inset_pulses` does):
+    - each pulse is generated and plotted once - on an offscreen axes, from which its lines and
+      filled areas are harvested - and cached per (pulses_args, errors);
+    - long traces are min-max decimated to max_points;
+    - all insets are drawn with a few collections (lines, areas, frames) in axes coordinates.
+    Calling `draw` again (eg with other offsets / sizes) replaces the previous insets, without
+    generating any pulse again.
+
+    Args:
+        create_pulses_fun: Called as create_pulses_fun(*pulses_args, stds=errors); must return
+            an object with `plot_pulse(ax)` and `time_list` (eg nf.neuron.StimulationPulse).
+        max_points (int, optional): Maximum number of points per drawn trace.
+    """
+
+    def __init__(self, create_pulses_fun: Callable, max_points: Optional[int] = 400):
+        self.create_pulses_fun = create_pulses_fun
+        self.max_points = max_points
+        self._cache: Dict[tuple, PulseTraces] = {}
+        self._offscreen_ax: Optional[plt.Axes] = None
+        self._artists: Dict[int, list] = {}  # id(ax) -> artists drawn by the last `draw`
+
+    def _harvest(self, pulse) -> PulseTraces:
+        if self._offscreen_ax is None:
+            self._offscreen_ax = Figure().add_subplot()  # not registered with pyplot
+        ax = self._offscreen_ax
+        ax.cla()
+        pulse.plot_pulse(ax)
+        traces = PulseTraces(xlim=(pulse.time_list[0], pulse.time_list[-1]))
+        for line in ax.get_lines():
+            x, y = (np.asarray(v, dtype=float) for v in line.get_data())
+            x, y = _decimate_minmax(x, y, self.max_points)
+            style = {
+                "color": line.get_color(),
+                "linestyle": line.get_linestyle(),
+                "linewidth": line.get_linewidth(),
+                "alpha": line.get_alpha(),
+            }
+            traces.lines.append((np.column_stack([x, y]), style))
+        for collection in ax.collections:
+            facecolors = collection.get_facecolor()
+            for i, path in enumerate(collection.get_paths()):
+                style = {"facecolor": facecolors[i % len(facecolors)] if len(facecolors) else None}
+                vertices = np.asarray(path.vertices, dtype=float)
+                if self.max_points is not None and len(vertices) > 2 * self.max_points:
+                    ## filled bands (eg +- std) only need their outline: plain subsampling
+                    step = int(np.ceil(len(vertices) / (2 * self.max_points)))
+                    vertices = np.vstack([vertices[::step], vertices[-1:]])
+                traces.areas.append((vertices, style))
+        ax.relim()
+        ax.autoscale_view()
+        traces.ylim = ax.get_ylim()
+        return traces
+
+    def get_traces(self, pulses_args: tuple, errors: tuple) -> PulseTraces:
+        key = (_freeze(pulses_args), _freeze(errors))
+        if key not in self._cache:
+            pulse = self.create_pulses_fun(*pulses_args, stds=errors)
+            self._cache[key] = self._harvest(pulse)
+        return self._cache[key]
+
+    def clear(self, ax: plt.Axes):
+        for artist in self._artists.pop(id(ax), []):
+            artist.remove()
+
+    def draw(
+        self,
+        ax: plt.Axes,
+        pulses_args: Sequence[tuple],
+        errors: Sequence[tuple],
+        pareto_points: Sequence[Tuple[float, float]],
+        flip_x_y: bool = True,
+        total_size: Tuple[float, float] = (0.5, 0.3),
+        partial_size: float = 0.4 * 100,
+        ylim: Optional[Tuple[float, float]] = None,
+        x_offsets: Union[float, Sequence[float]] = 0.0,
+        y_offsets: Union[float, Sequence[float]] = 0.0,
+        arrows: bool = True,
+    ) -> list:
+        """Draw one inset per Pareto point (pulses_args, errors and pareto_points being one entry
+        per point, eg X[i], stds[i], F[i]). If ylim (amplitude range of the insets) is None, each
+        inset is scaled to its own pulse.
+
+        Sizes and offsets mean the same as in `add_inset_pulses`, but the box is centered on the
+        point in axes coordinates, (x - x_min) / width, whereas add_inset_pulses uses x / width:
+        the insets are only placed the same when the axis limits start at 0."""
+        self.clear(ax)
+        n = len(pareto_points)
+        x_offsets = np.broadcast_to(np.asarray(x_offsets, dtype=float), (n,))
+        y_offsets = np.broadcast_to(np.asarray(y_offsets, dtype=float), (n,))
+        (x_min, x_max), (y_min, y_max) = ax.get_xlim(), ax.get_ylim()
+        width, height = x_max - x_min, y_max - y_min
+        inset_w, inset_h = (total_size[0] * partial_size / 100, total_size[1] * partial_size / 100)
+
+        lines, line_styles, areas, area_colors, frames, zero_lines = [], [], [], [], [], []
+        artists = []
+        for i in range(n):
+            traces = self.get_traces(pulses_args[i], errors[i])
+            y, x = pareto_points[i] if flip_x_y else pareto_points[i][::-1]
+            ## box of total_size centered on the point, inset in its lower right corner
+            box_x = (x - x_min) / width - total_size[0] / 2 + x_offsets[i]
+            box_y = (y - y_min) / height - total_size[1] / 2 + y_offsets[i]
+            x0, y0 = box_x + total_size[0] - inset_w, box_y
+            frames.append(patches.Rectangle((x0, y0), inset_w, inset_h))
+
+            (t0, t1), (a0, a1) = traces.xlim, ylim or traces.ylim
+
+            def to_axes(xy: np.ndarray) -> np.ndarray:
+                return np.column_stack(
+                    [
+                        x0 + (xy[:, 0] - t0) / (t1 - t0) * inset_w,
+                        y0 + (np.clip(xy[:, 1], a0, a1) - a0) / (a1 - a0) * inset_h,
+                    ]
+                )
+
+            for xy, style in traces.lines:
+                lines.append(to_axes(xy))
+                line_styles.append(style)
+            for vertices, style in traces.areas:
+                areas.append(to_axes(vertices))
+                area_colors.append(style["facecolor"])
+            if a0 < 0 < a1:
+                zero_lines.append(to_axes(np.array([[t0, 0.0], [t1, 0.0]])))
+
+            if arrows:
+                ## same arrow as add_inset_pulses
+                ax_x0 = (((50.0 - partial_size) / 100.0) * total_size[0] + x_offsets[i] - 0.01) * width
+                ax_y0 = ((50.0 - partial_size) / 100.0 * total_size[1] - y_offsets[i] - 0.08) * height
+                arrow = patches.FancyArrowPatch(
+                    (x, y),
+                    (x + ax_x0, (y - ax_y0) - 0.12 * height),
+                    color="black",
+                    mutation_scale=15,
+                    arrowstyle="->",
+                    linestyle="--",
+                    alpha=0.75,
+                )
+                artists.append(ax.add_patch(arrow))
+
+        common = dict(transform=ax.transAxes, clip_on=False, zorder=5)
+        artists.append(
+            ax.add_collection(
+                PatchCollection(
+                    frames, facecolor="white", edgecolor="black", linewidth=0.8, **common
+                ),
+                autolim=False,
+            )
+        )
+        if areas:
+            artists.append(
+                ax.add_collection(
+                    PolyCollection(areas, facecolors=area_colors, linewidths=0, **common),
+                    autolim=False,
+                )
+            )
+        artists.append(
+            ax.add_collection(
+                LineCollection(
+                    zero_lines, colors="gray", linestyles="--", alpha=0.5, **common
+                ),
+                autolim=False,
+            )
+        )
+        if lines:
+            artists.append(
+                ax.add_collection(
+                    LineCollection(
+                        lines,
+                        colors=[s["color"] for s in line_styles],
+                        linestyles=[s["linestyle"] for s in line_styles],
+                        linewidths=[s["linewidth"] for s in line_styles],
+                        **common,
+                    ),
+                    autolim=False,
+                )
+            )
+        self._artists[id(ax)] = artists
+        return artists
+
+
+def add_inset_pulses_batch(
+    X: Sequence[tuple],
+    errors: Sequence[tuple],
+    F: Sequence[Tuple[float, float]],
+    ax: plt.Axes,
+    create_pulses_fun: Union[Callable, PulseInsetRenderer],
+    **draw_kwargs,
+) -> PulseInsetRenderer:
+    """Insets of the pulses of all points F (eg the Pareto front) at once - see
+    PulseInsetRenderer. Pass the returned renderer instead of create_pulses_fun in later
+    calls (eg to move insets around) to reuse the pulses already generated."""
+    renderer = (
+        create_pulses_fun
+        if isinstance(create_pulses_fun, PulseInsetRenderer)
+        else PulseInsetRenderer(create_pulses_fun)
+    )
+    renderer.draw(ax, X, errors, F, **draw_kwargs)
+    return renderer
@@ -0,0 +1,133 @@
+import multiprocessing
+import os
+import subprocess
+import git
+import pytest
+from mmux_utils import funs_git
+
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "test",
+    "GIT_AUTHOR_EMAIL": "test@example.com",
+    "GIT_COMMITTER_NAME": "test",
+    "GIT_COMMITTER_EMAIL": "test@example.com",
+}
+
+
+def _git(*args, cwd):
+    return subprocess.run(
+        ["git", *args],
+        cwd=cwd,
+        check=True,
+        capture_output=True,
+        text=True,
+        env={**os.environ, **GIT_ENV},
+    ).stdout.strip()
+
+
+def _commit(repo, version: int) -> str:
+    (repo / "model.py").write_text(f"VERSION = {version}\n\ndef f(x):\n    return x + VERSION\n")
+    _git("add", ".", cwd=repo)
+    _git("commit", "-q", "-m", f"version {version}", cwd=repo)
+    return _git("rev-parse", "HEAD", cwd=repo)
+
+
+@pytest.fixture
+def model_repo(tmp_path):
+    repo = tmp_path / "model"
+    repo.mkdir()
+    _git("init", "-q", "-b", "main", cwd=repo)
+    sha = _commit(repo, 1)
+    return repo, sha
+
+
+def test_worktree_export(model_repo, tmp_path):
+    repo, sha = model_repo
+    repo_path = funs_git.clone_repo(repo.as_uri(), sha, tmp_path / "run", tmp_path / "cache")
+    assert (repo_path / "model.py").read_text().startswith("VERSION = 1")
+    assert funs_git.get_commit_hash(repo_path) == sha  # still a git checkout
+    assert funs_git.import_function_from_repo(repo_path, "model.py", "f", sha[:10])(1) == 2
+
+
+def test_archive_export(model_repo, tmp_path):
+    repo, sha = model_repo
+    repo_path = funs_git.clone_repo(
+        repo.as_uri(), sha, tmp_path / "run", tmp_path / "cache", export="archive"
+    )
+    assert (repo_path / "model.py").read_text().startswith("VERSION = 1")
+    assert not (repo_path / ".git").exists()
+
+
+def test_known_sha_does_not_fetch(model_repo, tmp_path):
+    repo, sha = model_repo
+    cache_dir = tmp_path / "cache"
+    mirror_path = funs_git.get_mirror(repo.as_uri(), sha, cache_dir)
+    ## with the origin gone, any fetch would fail
+    repo.rename(tmp_path / "gone")
+    assert funs_git.get_mirror(repo.as_uri(), sha, cache_dir) == mirror_path
+    with pytest.raises(git.GitCommandError):
+        funs_git.get_mirror(repo.as_uri(), "main", cache_dir)  # a branch is always fetched
+
+
+def test_branch_is_refreshed(model_repo, tmp_path):
+    repo, _ = model_repo
+    cache_dir = tmp_path / "cache"
+    first = funs_git.clone_repo(repo.as_uri(), "main", tmp_path / "run1", cache_dir)
+    new_sha = _commit(repo, 2)
+    second = funs_git.clone_repo(repo.as_uri(), "main", tmp_path / "run2", cache_dir)
+    assert (first / "model.py").read_text().startswith("VERSION = 1")
+    assert (second / "model.py").read_text().startswith("VERSION = 2")
+    assert funs_git.get_commit_hash(second) == new_sha
+
+
+def test_unknown_commit(model_repo, tmp_path):
+    repo, _ = model_repo
+    with pytest.raises(ValueError):
+        funs_git.get_mirror(repo.as_uri(), "0" * 40, tmp_path / "cache")
+
+
+def _clone_in_process(args):
+    repo_url, commit_hash, run_dir, cache_dir, export = args
+    repo_path = funs_git.clone_repo(repo_url, commit_hash, run_dir, cache_dir, export=export)
+    return (repo_path / "model.py").read_text()
+
+
+def test_concurrent_processes(model_repo, tmp_path):
+    repo, sha = model_repo
+    cache_dir = tmp_path / "cache"
+    jobs = [
+        (repo.as_uri(), sha, tmp_path / f"run{i}", cache_dir, ("worktree", "archive")[i % 2])
+        for i in range(8)
+    ]
+    with multiprocessing.get_context("spawn").Pool(8) as pool:
+        contents = pool.map(_clone_in_process, jobs)
+    assert all(c.startswith("VERSION = 1") for c in contents)
+    assert len(list(cache_dir.glob("*.git"))) == 1  # a single mirror
+    assert not list(cache_dir.glob("*.tmp*"))
+
+
+def _hold_lock(args):
+    lock_path, out_path, i = args
+    for _ in range(10):
+        with funs_git._FileLock(lock_path):
+            with open(out_path, "a") as f:
+                f.write(f"start {i}\n")
+            with open(out_path, "a") as f:
+                f.write(f"end {i}\n")
+
+
+def test_file_lock_is_exclusive(tmp_path):
+    lock_path, out_path = tmp_path / "x.lock", tmp_path / "out"
+    with multiprocessing.get_context("spawn").Pool(4) as pool:
+        pool.map(_hold_lock, [(lock_path, out_path, i) for i in range(4)])
+    lines = out_path.read_text().splitlines()
+    assert len(lines) == 80
+    for start, end in zip(lines[::2], lines[1::2]):
+        assert start.startswith("start") and end == "end" + start[len("start") :]
+
+
+def test_file_lock_timeout(tmp_path):
+    lock_path = tmp_path / "x.lock"
+    with funs_git._FileLock(lock_path):
+        with pytest.raises(TimeoutError):
+            with funs_git._FileLock(lock_path, timeout=0.2):
+                pass
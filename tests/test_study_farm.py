@@ -0,0 +1,83 @@
+import os
+import time
+import pytest
+from mmux_utils.funs_study_farm import run_studies
+
+FAKE_DAKOTA = "mmux_utils.funs_fake_dakota"
+
+CONFIG = """environment
+  tabular_data
+    tabular_data_file = 'results.dat'
+method
+  sampling
+    samples = 6
+variables
+  continuous_design = 2
+    descriptors 'x1' 'x2'
+responses
+  objective_functions = 1
+    descriptors 'f'
+  no_gradients
+  no_hessians
+"""
+
+
+## evaluators are module-level functions, so that the (spawned) study workers can unpickle them
+def ok_evaluator(batch_input):
+    return [{"fns": [sum(input["cv"])]} for input in batch_input]
+
+
+def failing_evaluator(batch_input):
+    raise RuntimeError("model failed " + "x" * 1_000_000)  # a report larger than a pipe buffer
+
+
+def crashing_evaluator(batch_input):
+    os._exit(3)
+
+
+def slow_evaluator(batch_input):
+    time.sleep(60)
+
+
+def test_run_studies_reports_each_study(tmp_path):
+    results = run_studies(
+        [CONFIG] * 4,
+        tmp_path,
+        evaluator=[ok_evaluator, failing_evaluator, crashing_evaluator, slow_evaluator],
+        names=["ok", "failed", "crashed", "timeout"],
+        max_workers=4,
+        dakota_module=FAKE_DAKOTA,
+        timeout=10,
+    )
+    by_name = {r.name: r for r in results}
+    assert [r.name for r in results] == ["ok", "failed", "crashed", "timeout"]
+
+    assert by_name["ok"].status == "ok"
+    assert by_name["ok"].exitcode == 0
+    results_file = by_name["ok"].results_file
+    assert results_file is not None and results_file.parent == by_name["ok"].run_dir
+    assert len(results_file.read_text().splitlines()) == 1 + 6  # header + samples
+
+    assert by_name["failed"].status == "failed"
+    assert "model failed" in by_name["failed"].error
+
+    assert by_name["crashed"].status == "crashed"
+    assert by_name["crashed"].exitcode == 3
+
+    assert by_name["timeout"].status == "timeout"
+    assert by_name["timeout"].elapsed >= 10
+
+    assert len({r.run_dir for r in results}) == 4
+
+
+def test_run_studies_limits_concurrency(tmp_path):
+    results = run_studies(
+        [CONFIG] * 3, tmp_path, evaluator=ok_evaluator, max_workers=1, dakota_module=FAKE_DAKOTA
+    )
+    assert [r.status for r in results] == ["ok"] * 3
+    assert [r.name for r in results] == ["study_0", "study_1", "study_2"]
+
+
+def test_run_studies_rejects_duplicate_names(tmp_path):
+    with pytest.raises(ValueError):
+        run_studies([CONFIG] * 2, tmp_path, names=["a", "a"], dakota_module=FAKE_DAKOTA)